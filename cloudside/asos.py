@@ -1,9 +1,32 @@
 # std lib stuff
+import re
+import json
+import mmap
+import time
+import queue
+import socket
+import hashlib
 import logging
 import warnings
-from ftplib import FTP, error_perm
+import datetime
+import collections
+import sqlite3
+import itertools
+import multiprocessing
+import threading
+import posixpath
+from ftplib import FTP, error_perm, error_reply, error_temp
 from pathlib import Path
 from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from contextlib import contextmanager
+from functools import partial, wraps
 
 import numpy
 import pandas
@@ -28,13 +51,104 @@ Obs = namedtuple("Obs", _fields)
 _logger = logging.getLogger(__name__)
 
 
-__all__ = ["fetch_files", "parse_file", "get_data", "Obs"]
+__all__ = [
+    "fetch_files",
+    "parse_file",
+    "iter_parse",
+    "get_data",
+    "get_data_many",
+    "update",
+    "tail",
+    "read_store",
+    "Obs",
+    "ParseCache",
+    "ParseDiagnostics",
+    "RawCatalog",
+]
 
 
 HOURLY = pandas.offsets.Hour(1)
 MONTHLY = pandas.offsets.MonthBegin(1)
 FIVEMIN = pandas.offsets.Minute(5)
 
+FTP_HOST = "ftp.ncei.noaa.gov"
+FTP_PORT = 21
+# be polite to the NCEI server
+MAX_CONNECTIONS = 4
+# bump this whenever a change to the parser changes its output so that
+# previously cached frames are ignored
+PARSER_VERSION = 1
+
+# size of the chunks written to disk during downloads
+BLOCKSIZE = 2**20
+# errors that mean an FTP session has dropped and should be replaced. Other
+# OSErrors (e.g., a full disk or a host name that can't be resolved) aren't
+# fixed by reconnecting.
+_FTP_DROPPED = (
+    EOFError,
+    ConnectionError,
+    TimeoutError,
+    socket.timeout,
+    error_reply,
+    error_temp,
+)
+# seconds to wait before reconnecting after a dropped session, doubled after
+# every failed attempt up to the maximum
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+_COVER = {
+    "CLR": 0.0000,
+    "SKC": 0.0000,
+    "NSC": 0.0000,
+    "NCD": 0.0000,
+    "FEW": 0.1785,
+    "SCT": 0.4375,
+    "BKN": 0.7500,
+    "VV": 0.9900,
+    "OVC": 1.0000,
+}
+
+# Fixed categories of the columns that can be stored as categoricals, so that
+# frames from different files can still be concatenated
+_CATEGORIES = {
+    "sky_cover": sorted(set(_COVER.values())),
+    "wind_direction": list(range(0, 361, 10)),
+}
+
+# The canonical layout of a line in the 5-minute ASOS files. Lines that match
+# this are decoded directly by the "fast" engine with the same results that
+# `MetarParser` would give. Everything else falls back to `MetarParser`.
+_ASOS_LINE_RE = re.compile(
+    r"""^\d{5}[A-Z][A-Z0-9]{3}\s(?!BLU|GRN|WHT|RED)[A-Z][A-Z0-9]{2}\d{15}
+        (?P<datetime>\d\d/\d\d/\d\d\s\d\d:\d\d:\d\d)\s+5-MIN\s+
+        [A-Z][A-Z0-9]{3}\s+(?P<day>\d\d)(?:[01]\d|2[0-3])[0-5]\dZ\s+
+        (?P<wind_dir>\d{3}|VRB)(?P<wind_speed>\d{2,3})(?:G\d{2,3})?KT
+        (?:\s+\d{3}V\d{3})?\s+
+        (?:[MP]?(?:\d+|\d\d?/\d\d?|\d+\s+\d/\d)SM\s+)+
+        (?:(?=\S)[-+]?(?:VC)?(?:MI|PR|BC|DR|BL|SH|TS|FZ)?(?:DZ|RA|SN|SG|IC|PL|GR|GS|UP)*
+            (?:BR|FG|FU|VA|DU|SA|HZ|PY)?\s+)*
+        (?P<sky>(?:(?:CLR|SKC|FEW|SCT|BKN|OVC|VV)(?:\d{3})?(?:CB|TCU)?\s+)*)
+        (?P<temp>M?\d{1,2})/(?P<dewpt>M?\d{1,2})?\s+
+        A(?P<altimeter>\d{4})
+        (?P<extra>(?:\s+(?:-?\d{1,5}|(?:\d{3}|VRB)/\d{2,3}(?:G\d{2,3})?|\d{3}V\d{3}))*)
+        \s+RMK\s(?P<remarks>.*)$""",
+    re.VERBOSE,
+)
+# groups that the metar library doesn't recognize but that are part of the
+# standard ASOS lines, namely the header and the extra values after the
+# altimeter setting
+_ROUTINE_GROUP_RE = re.compile(
+    r"""^(?:\d{5}[A-Z][A-Z0-9]{3}|[A-Z][A-Z0-9]{2}\d{15}\d\d/\d\d/\d\d|\d\d:\d\d:\d\d
+        |5-MIN|-?\d{1,5}|(?:\d{3}|VRB)/\d{2,3}(?:G\d{2,3})?|\d{3}V\d{3})$""",
+    re.VERBOSE,
+)
+_PRESS_RE = r"^(?:.*\s)?(\d{3,4})(?:\s|$)"
+_PRECIP_1HR_RE = r"^(?:.*\s)?P(\d{4})(?:\s|$)"
+_TEMP_1HR_RE = r"^(?:.*\s)?T([01])(\d{3})(?:([01])(\d{3}))?(?:\s|$)"
+_PEAK_WIND_RE = r"P[A-Z]\s+WND\s+\d{5,6}/(?:[01]\d|2[0-3])?[0-5]\d(?=\s|$)"
+_WIND_SHIFT_RE = r"WSHFT\s+(?:[01]\d|2[0-3])?[0-5]\d(?=\s|$)"
+
 
 def value_or_not(obs_attr):
     if obs_attr is None:
@@ -43,15 +157,32 @@ def value_or_not(obs_attr):
         return obs_attr.value()
 
 
+def _recording_failure(handler):
+    """Wraps a handler of the metar library so that the parser remembers
+    which handler (if any) stopped it.
+    """
+
+    @wraps(handler)
+    def wrapper(self, d):
+        try:
+            handler(self, d)
+        except Exception:
+            self._failed_handler = handler.__name__
+            raise
+
+    return wrapper
+
+
 class MetarParser(Metar.Metar):
+    handlers = [(p, _recording_failure(h), r) for p, h, r in Metar.Metar.handlers]
+    remark_handlers = [
+        (p, _recording_failure(h)) for p, h in Metar.Metar.remark_handlers
+    ]
+
     def __init__(self, *args, **kwargs):
         self._datetime = None
-        with warnings.catch_warnings(record=True) as w:
-            warnings.simplefilter("always")
-            super().__init__(*args, **kwargs)
-            if len(w) > 1:
-                for _w in w:
-                    _logger.info(_w.message)
+        self._failed_handler = None
+        super().__init__(*args, **kwargs)
 
     def _unparsed_group_handler(self, d):
         """
@@ -66,41 +197,30 @@ class MetarParser(Metar.Metar):
             self._datetime = pandas.Timestamp(self.code[28:45])
         return self._datetime
 
-    def asos_dict(self):
-        if self.datetime is not None:
-            wind_dir = value_or_not(self.wind_dir)
-            if wind_dir == "VRB":
-                wind_dir = numpy.nan
+    def asos_dict(self, fields=None):
+        """Decodes the observation into an `Obs` or, if only some *fields*
+        are requested, a dict of the datetime and those fields.
+        """
+        if fields is None:
+            if self.datetime is None:
+                return Obs(*[None] * len(_fields))
             return Obs(
                 datetime=self.datetime.round("5min"),
-                raw_precipitation=value_or_not(self.precip_1hr),
-                temperature=value_or_not(self.temp),
-                dew_point=value_or_not(self.dewpt),
-                wind_speed=value_or_not(self.wind_speed),
-                wind_direction=wind_dir,
-                air_pressure=value_or_not(self.press),
-                sky_cover=_process_sky_cover(self),
+                **{field: _DECODERS[field](self) for field in _fields[1:]},
             )
-        else:
-            _blanks = [None] * 8
-            return Obs(*_blanks)
+
+        if self.datetime is None:
+            return dict.fromkeys(["datetime", *fields])
+        obs = {"datetime": self.datetime.round("5min")}
+        for field in fields:
+            obs[field] = _DECODERS[field](self)
+        return obs
 
 
 def _process_sky_cover(obs):
-    coverdict = {
-        "CLR": 0.0000,
-        "SKC": 0.0000,
-        "NSC": 0.0000,
-        "NCD": 0.0000,
-        "FEW": 0.1785,
-        "SCT": 0.4375,
-        "BKN": 0.7500,
-        "VV": 0.9900,
-        "OVC": 1.0000,
-    }
     coverlist = []
     for sky in obs.sky:
-        coverval = coverdict[sky[0]]
+        coverval = _COVER[sky[0]]
         coverlist.append(coverval)
 
     if len(coverlist) > 0:
@@ -111,6 +231,41 @@ def _process_sky_cover(obs):
     return cover
 
 
+def _process_wind_direction(obs):
+    wind_dir = value_or_not(obs.wind_dir)
+    if wind_dir == "VRB":
+        wind_dir = numpy.nan
+    return wind_dir
+
+
+# how each field of an `Obs` is decoded from a `MetarParser`
+_DECODERS = {
+    "raw_precipitation": lambda obs: value_or_not(obs.precip_1hr),
+    "temperature": lambda obs: value_or_not(obs.temp),
+    "dew_point": lambda obs: value_or_not(obs.dewpt),
+    "wind_speed": lambda obs: value_or_not(obs.wind_speed),
+    "wind_direction": _process_wind_direction,
+    "air_pressure": lambda obs: value_or_not(obs.press),
+    "sky_cover": _process_sky_cover,
+}
+
+
+def _resolve_fields(fields, new_precipcol="precipitation"):
+    """Validates the *fields* requested from a parser and returns them in
+    the order of `Obs`. *new_precipcol* is an alias of "raw_precipitation".
+    """
+    if fields is None:
+        return tuple(_fields[1:])
+    if isinstance(fields, str):
+        fields = [fields]
+
+    requested = {"raw_precipitation" if f == new_precipcol else f for f in fields}
+    unknown = requested.difference(_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}, choose from {_fields[1:]}")
+    return tuple(f for f in _fields[1:] if f in requested)
+
+
 def _fetch_file(
     station_id,
     timestamp,
@@ -119,6 +274,9 @@ def _fetch_file(
     force_download=False,
     past_attempts=0,
     max_attempts=10,
+    compression=None,
+    catalog=None,
+    listing=None,
 ):
     """Fetches a single file from the ASOS ftp and returns its pathh on the
     local file system
@@ -137,52 +295,455 @@ def _fetch_file(
     force_download : bool (default is False)
         See to the True to force re-downloading of ASOS data that already
         exist
+    past_attempts, max_attempts : int
+        Number of attempts to download the file that have already been made
+        and the maximum number of attempts allowed.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the file compressed (as ".dat.gz" or ".dat.zst"). Files that
+        were already downloaded are used as they are, compressed or not.
+    catalog : RawCatalog, optional
+        Catalog of the files in *raw_folder*. Downloads are recorded in it,
+        files that it shows were only partly downloaded are fetched again,
+        and a forced download is skipped if the remote file hasn't changed.
+    listing : dict, optional
+        The sizes of the files in the remote folder, keyed by name (see
+        `_list_folder`). Files that aren't in it aren't requested, and a
+        local copy is downloaded again if its size doesn't match.
 
     Returns
     -------
     dst_path : pathlib.Path
         Object representing the location of the downloaded file's location on
-        the local file system
+        the local file system. None if the file could not be downloaded.
+
+    Notes
+    -----
+    Files are transferred in binary mode into a temporary ".part" file next
+    to the destination and renamed once they are complete. If a transfer is
+    interrupted, the next attempt resumes from the end of the ".part" file.
+    Compressed files are written from the complete ".part" file.
+
+    """
+
+    ftpfolder, src_name = _remote_file(station_id, timestamp)
+    dst_path = Path(raw_folder).joinpath(src_name + validate.compression(compression))
+    stored = validate.stored_file(Path(raw_folder).joinpath(src_name))
+    entry = None if catalog is None else catalog.get(station_id, timestamp)
+    truncated = entry is not None and not entry.complete
+
+    remote_size = None
+    if listing is not None:
+        if src_name not in listing:
+            if stored is None:
+                _logger.log(logging.ERROR, f"No such file {src_name}")
+            return stored
+        remote_size = listing[src_name]
+        local_size = _local_size(stored, entry)
+        if None not in (remote_size, local_size) and local_size != remote_size:
+            truncated = True
+
+    if stored is not None and not (force_download or truncated):
+        return stored
+
+    if catalog is not None and remote_size is None:
+        remote_size = _remote_size(ftp, f"{ftpfolder}/{src_name}")
+    if catalog is not None:
+        unchanged = entry is not None and entry.remote_size == remote_size
+        if stored is not None and unchanged and not truncated:
+            _logger.log(logging.INFO, f"{src_name} hasn't changed, not fetching")
+            return stored
 
+    # downloads land in a ".part" file that is only renamed once complete,
+    # so an interrupted transfer can be picked up where it left off
+    part_path = dst_path.with_name(src_name + ".part")
+    if force_download:
+        part_path.unlink(missing_ok=True)
+
+    while past_attempts < max_attempts:
+        past_attempts += 1
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        try:
+            with part_path.open(mode="ab") as dst_obj:
+                ftp.retrbinary(
+                    f"RETR {ftpfolder}/{src_name}",
+                    dst_obj.write,
+                    blocksize=BLOCKSIZE,
+                    rest=offset or None,
+                )
+        except TimeoutError:  # pragma: no cover
+            _logger.log(
+                logging.WARNING,
+                f"Timedout fetch {src_name} on attempt {past_attempts}",
+            )
+        except error_perm:
+            part_path.unlink()
+            if not offset:
+                _logger.log(logging.ERROR, f"No such file {src_name}")
+                return None
+            # the server wouldn't resume the transfer, so start over
+        else:
+            local_size = part_path.stat().st_size
+            checksum = _store_raw_file(part_path, dst_path)
+            if catalog is not None:
+                catalog.record_fetch(
+                    station_id,
+                    timestamp,
+                    dst_path,
+                    local_size,
+                    checksum,
+                    remote_size=remote_size,
+                )
+            return dst_path
+
+    return None
+
+
+def _store_raw_file(part_path, dst_path):
+    """Moves a completely downloaded file into place, compressing it if the
+    destination's name calls for it, and removes any other copies of it.
+    Returns the SHA-256 checksum of the (uncompressed) contents.
     """
+    checksum = hashlib.sha256()
+    with part_path.open("rb") as src:
+        blocks = iter(partial(src.read, BLOCKSIZE), b"")
+        if dst_path.name == part_path.stem:
+            for block in blocks:
+                checksum.update(block)
+            part_path.replace(dst_path)
+        else:
+            # e.g., "*.dat.part.gz", so it is compressed like the destination
+            tmp_path = part_path.with_name(part_path.name + dst_path.suffix)
+            with validate.open_raw(tmp_path, "wb") as dst:
+                for block in blocks:
+                    checksum.update(block)
+                    dst.write(block)
+            tmp_path.replace(dst_path)
+            part_path.unlink()
+
+    for suffix in validate.COMPRESSION_SUFFIXES.values():
+        other = part_path.with_name(part_path.stem + suffix)
+        if other != dst_path:
+            other.unlink(missing_ok=True)
+    return checksum.hexdigest()
 
+
+def _remote_file(station_id, timestamp):
+    """Folder and name of a station's month of data on the ftp server"""
     ftpfolder = f"/pub/data/asos-fivemin/6401-{timestamp.year}"
     src_name = f"64010{station_id}{timestamp.year}{timestamp.month:02d}.dat"
-    dst_path = Path(raw_folder).joinpath(src_name)
-    has_failed = False
-    if (not dst_path.exists()) or force_download:
-        with dst_path.open(mode="w", encoding="utf-8") as dst_obj:
+    return ftpfolder, src_name
+
+
+def _local_size(stored, entry=None):
+    """Size of the uncompressed contents of a stored file, if it's known
+    without reading it
+    """
+    if stored is None:
+        return None
+    elif validate.compression_of(stored) is None:
+        return stored.stat().st_size
+    elif entry is not None and entry.name == stored.name:
+        return entry.local_size
+    return None
+
+
+def _list_folder(ftp, ftpfolder):
+    """Lists the files in a folder on the ftp server with one command.
+    Returns their sizes keyed by name. The sizes are None if the server
+    doesn't support MLSD. Folders that don't exist are empty.
+    """
+    try:
+        return {
+            name: int(facts["size"]) if "size" in facts else None
+            for name, facts in ftp.mlsd(ftpfolder, facts=["type", "size"])
+            if facts.get("type", "file") == "file"
+        }
+    except error_perm:
+        pass
+
+    try:
+        names = ftp.nlst(ftpfolder)
+    except error_perm:
+        return {}
+    return {posixpath.basename(name): None for name in names}
+
+
+def _remote_size(ftp, path):
+    """Size of a file on the ftp server in bytes, or None if it's unknown"""
+    try:
+        ftp.voidcmd("TYPE I")
+        return ftp.size(path)
+    except error_perm:
+        return None
+
+
+class _CatalogEntry(
+    namedtuple(
+        "_CatalogEntry",
+        [
+            "source",
+            "station",
+            "month",
+            "name",
+            "remote_size",
+            "local_size",
+            "checksum",
+            "fetched",
+            "parse_status",
+        ],
+    )
+):
+    @property
+    def complete(self):
+        """Whether every byte of the remote file was downloaded, as far as
+        is known.
+        """
+        return self.remote_size is None or self.local_size == self.remote_size
+
+
+class RawCatalog:
+    """SQLite catalog of the raw files in a folder: where each file of a
+    station and month came from, how big it was, when it was fetched and
+    whether it could be parsed.
+
+    With a catalog, the raw files that need to be fetched are planned with
+    a single query and the listings of the remote year folders instead of
+    looking at every file on disk. Files that were only partly downloaded or
+    that changed size on the server are fetched again, and a forced download
+    is skipped if the remote file hasn't changed size since it was fetched.
+
+    Parameters
+    ----------
+    folder : str or pathlib.Path
+        Directory of the raw files. The catalog is stored in it as
+        "catalog.sqlite".
+
+    Notes
+    -----
+    The catalog is trusted: a file that is deleted or changed outside of
+    `fetch_files` should also be removed from it with `forget`.
+
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.path = self.folder.joinpath("catalog.sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS raw_files (
+                    source TEXT NOT NULL,
+                    station TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    remote_size INTEGER,
+                    local_size INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    fetched TEXT NOT NULL,
+                    parse_status TEXT,
+                    PRIMARY KEY (source, station, month)
+                )""")
+
+    def __repr__(self):
+        return f"RawCatalog({str(self.folder)!r})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def _query(self, sql, params=()):
+        with self._lock, self._db:
+            return [_CatalogEntry(*row) for row in self._db.execute(sql, params)]
+
+    def path_of(self, entry):
+        """Location of a cataloged file on the local file system"""
+        return self.folder.joinpath(entry.name)
+
+    def get(self, station_id, timestamp, source="asos"):
+        """Returns the entry of a station's month, or None if there isn't one"""
+        entries = self.entries([station_id], [timestamp], source=source)
+        return entries.get((station_id, f"{timestamp:%Y-%m}"))
+
+    def entries(self, station_ids, timestamps, source="asos"):
+        """Looks up the entries of several stations and months at once
+
+        Parameters
+        ----------
+        station_ids : list of str
+        timestamps : list of datetime-like
+            Any timestamp within each month.
+        source : str (default is "asos")
+
+        Returns
+        -------
+        entries : dict
+            The entries that exist, keyed by (station_id, "YYYY-MM").
+
+        """
+
+        months = sorted({f"{ts:%Y-%m}" for ts in timestamps})
+        station_ids = list(dict.fromkeys(station_ids))
+        if not months or not station_ids:
+            return {}
+
+        marks = ", ".join("?" * len(station_ids))
+        rows = self._query(
+            "SELECT * FROM raw_files WHERE source = ? AND month BETWEEN ? AND ? "
+            f"AND station IN ({marks})",
+            (source, months[0], months[-1], *station_ids),
+        )
+        months = set(months)
+        return {(e.station, e.month): e for e in rows if e.month in months}
+
+    def record_fetch(
+        self,
+        station_id,
+        timestamp,
+        path,
+        local_size,
+        checksum,
+        remote_size=None,
+        source="asos",
+    ):
+        """Records a file that was just downloaded, replacing older entries"""
+        fetched = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self._query(
+            "INSERT OR REPLACE INTO raw_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+            (
+                source,
+                station_id,
+                f"{timestamp:%Y-%m}",
+                Path(path).name,
+                remote_size,
+                local_size,
+                checksum,
+                fetched,
+            ),
+        )
+
+    def record_parse(self, path, status):
+        """Records the outcome of parsing a cataloged file (e.g., "ok")"""
+        self._query(
+            "UPDATE raw_files SET parse_status = ? WHERE name = ?",
+            (status, Path(path).name),
+        )
+
+    def forget(self, path):
+        """Removes a file from the catalog"""
+        self._query("DELETE FROM raw_files WHERE name = ?", (Path(path).name,))
+
+
+class _FTPPool:
+    """A pool of logged-in FTP sessions that can be shared between threads.
+
+    Sessions are opened as they're needed, up to *size* of them at once, and
+    any session that drops in the middle of a transfer is closed and replaced
+    with a new one.
+
+    Each remote folder is listed once and the listing is kept for the life of
+    the pool, so months that don't exist on the server are never requested.
+
+    """
+
+    def __init__(self, email, size=1, host=None, port=None):
+        self.email = email
+        self.host = host or FTP_HOST
+        self.port = port or FTP_PORT
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._listings = {}
+        self._listing_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        ftp = FTP()
+        ftp.connect(self.host, self.port)
+        ftp.login(passwd=self.email)
+        return ftp
+
+    @contextmanager
+    def session(self):
+        with self._slots:
             try:
-                past_attempts += 1
-                ftp.retrlines(
-                    f"RETR {ftpfolder}/{src_name}", lambda x: dst_obj.write(x + "\n")
-                )
-            except TimeoutError:  # pragma: no cover
-                _logger.log(
-                    logging.WARNING,
-                    f"Timedout fetch {src_name} on attempt {past_attempts}",
-                )
-                if past_attempts >= max_attempts:
-                    has_failed = True
-                else:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                ftp = self._connect()
+
+            try:
+                yield ftp
+            except BaseException:
+                # the session may be in the middle of a command, so it can't
+                # be reused
+                ftp.close()
+                raise
+            self._idle.put(ftp)
+
+    def fetch(self, station_id, timestamp, raw_folder, max_attempts=10, **kwargs):
+        """Fetches a single file with `_fetch_file`, reconnecting and trying
+        again if the session drops. The attempts are spaced out with an
+        exponential backoff (see `RECONNECT_DELAY`). Any other error, such as
+        a host name that can't be resolved or a local file that can't be
+        written, is raised right away.
+        """
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.session() as ftp:
+                    ftpfolder, _ = _remote_file(station_id, timestamp)
+                    listing = self.listing(ftp, ftpfolder)
                     return _fetch_file(
                         station_id,
                         timestamp,
                         ftp,
                         raw_folder,
-                        force_download=force_download,
-                        past_attempts=past_attempts,
-                        max_attempts=max_attempts,
+                        listing=listing,
+                        **kwargs,
                     )
-            except error_perm:
-                _logger.log(logging.ERROR, f"No such file {src_name}")
-                has_failed = True
+            except _FTP_DROPPED as err:
+                if attempt >= max_attempts:
+                    raise
+                delay = min(RECONNECT_DELAY * 2 ** (attempt - 1), MAX_RECONNECT_DELAY)
+                _logger.log(
+                    logging.WARNING,
+                    f"Lost FTP connection fetching {timestamp:%Y-%m} on attempt "
+                    f"{attempt}, reconnecting in {delay}s: {err!r}",
+                )
+                time.sleep(delay)
+
+    def listing(self, ftp, ftpfolder):
+        """The files in a remote folder and their sizes. See `_list_folder`."""
+        with self._listing_lock:
+            if ftpfolder not in self._listings:
+                self._listings[ftpfolder] = _list_folder(ftp, ftpfolder)
+            return self._listings[ftpfolder]
 
-        if has_failed:
-            dst_path.unlink()
-            dst_path = None
+    def remote_sizes(self, ftpfolder):
+        """The listing of a remote folder (see `listing`), opening a session
+        for it only if it wasn't listed already.
+        """
+        with self._listing_lock:
+            if ftpfolder in self._listings:
+                return self._listings[ftpfolder]
+        with self.session() as ftp:
+            return self.listing(ftp, ftpfolder)
 
-    return dst_path
+    def close(self):
+        while not self._idle.empty():
+            ftp = self._idle.get_nowait()
+            try:
+                ftp.quit()
+            except _FTP_DROPPED:  # pragma: no cover
+                ftp.close()
 
 
 def fetch_files(
@@ -193,6 +754,9 @@ def fetch_files(
     raw_folder,
     force_download=False,
     pbar_fxn=None,
+    connections=1,
+    compression=None,
+    catalog=None,
 ):
     """Fetches a single file from the ASOS ftp and returns its path on the
     local file system
@@ -215,6 +779,16 @@ def fetch_files(
     pbar_fxn : callable, optional
         A tqdm-like progress bar function such as `tqdm.tqdm` or
         `tqdm.tqdm_notebook`.
+    connections : int (default is 1)
+        Number of FTP sessions used to download files concurrently. This is
+        capped at `MAX_CONNECTIONS`.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the downloaded files compressed. See `_fetch_file`.
+    catalog : RawCatalog, optional
+        Catalog of the files in *raw_folder*. Months that it shows were
+        completely downloaded are used without looking at the files
+        themselves, as long as their size in the listing of the remote year
+        folder hasn't changed (unless *force_download* is True).
 
     Returns
     -------
@@ -225,45 +799,188 @@ def fetch_files(
     """
 
     dates = pandas.date_range(startdate, stopdate, freq=MONTHLY)
-    dates_to_fetch = validate.progress_bar(pbar_fxn, dates, desc="Fetching")
-    with FTP("ftp.ncei.noaa.gov") as ftp:
-        ftp.login(passwd=email)
-        raw_paths = [
-            _fetch_file(station_id, ts, ftp, raw_folder, force_download)
-            for ts in dates_to_fetch
-        ]
+    jobs = [(station_id, ts) for ts in dates]
+    connections = max(1, min(connections, MAX_CONNECTIONS))
+    with _FTPPool(email, size=connections) as pool:
+        known, to_fetch = _plan_fetches(catalog, jobs, pool, force_download)
+        fetcher = partial(
+            pool.fetch,
+            station_id,
+            raw_folder=raw_folder,
+            force_download=force_download,
+            compression=compression,
+            catalog=catalog,
+        )
+        dates_to_fetch = [ts for _, ts in to_fetch]
+        if connections == 1:
+            fetched = [
+                fetcher(ts)
+                for ts in validate.progress_bar(
+                    pbar_fxn, dates_to_fetch, desc="Fetching"
+                )
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=connections) as executor:
+                fetched = list(
+                    validate.progress_bar(
+                        pbar_fxn,
+                        executor.map(fetcher, dates_to_fetch),
+                        desc="Fetching",
+                        total=len(dates_to_fetch),
+                    )
+                )
+    known.update(zip(to_fetch, fetched))
+    raw_paths = [known[job] for job in jobs]
     return filter(lambda x: x is not None, raw_paths)
 
 
-def _find_reset_time(precip_ts):
+def _iter_fetched(fetch, jobs, connections=1, maxsize=0):
+    """Runs *fetch* over the *jobs* on *connections* threads and yields
+    (job, result) pairs as the downloads finish. An error raised by *fetch*
+    is yielded as the job's result.
+
+    When *maxsize* results are waiting to be taken, the threads wait before
+    starting on another job.
+    """
+    results = queue.Queue(maxsize)
+    todo = queue.SimpleQueue()
+    for job in jobs:
+        todo.put(job)
+    stop = threading.Event()
+
+    def work():
+        while not stop.is_set():
+            try:
+                job = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = fetch(job)
+            except Exception as err:
+                result = err
+            results.put((job, result))
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(len(jobs)):
+            yield results.get()
+    finally:
+        # let any thread that's waiting on a full queue finish
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _plan_fetches(catalog, jobs, pool, force_download=False):
+    """Finds the (station_id, timestamp) *jobs* that the *catalog* shows were
+    completely downloaded and that haven't changed on the server since. The
+    catalog is read with one query and the remote sizes come from the
+    *pool*'s listings of the year folders, one command per year. Returns the
+    paths of the unchanged files, keyed by job, and the jobs that still need
+    to go through `_fetch_file`.
+    """
+    known = {}
+    if catalog is not None and not force_download:
+        entries = catalog.entries([sta for sta, _ in jobs], [ts for _, ts in jobs])
+        for station_id, ts in jobs:
+            entry = entries.get((station_id, f"{ts:%Y-%m}"))
+            if entry is None or not entry.complete:
+                continue
+
+            # files that are missing from the listing or whose size isn't
+            # listed are left to `_fetch_file` to sort out
+            ftpfolder, src_name = _remote_file(station_id, ts)
+            try:
+                remote_size = pool.remote_sizes(ftpfolder).get(src_name)
+            except _FTP_DROPPED:
+                remote_size = None
+            if remote_size is not None and remote_size == entry.local_size:
+                known[(station_id, ts)] = catalog.path_of(entry)
+    return known, [job for job in jobs if job not in known]
+
+
+def _find_reset_time(precip_ts, freq=None):
     """Determines the precipitation gauge's accumulation reset time.
 
     Parameters
     ----------
     precip_ts : pandas.Series
         Time series of the raw precipitation data.
+    freq : str or pandas offset, optional
+        When provided, the reset time is estimated separately for every
+        period of this length (e.g., "D" or "W") from the hours in which the
+        gauge accumulated rain. Periods without any rain use the reset time of
+        the period before them.
 
     Returns
     -------
-    rt : int
+    rt : int or numpy.ndarray
         The minute of the hour which is most likely the reset time for the
-        chunk of data.
+        chunk of data. If *freq* is provided, an array of the reset minute at
+        every timestamp of *precip_ts*.
     """
 
-    def get_idxmin(g):
-        if g.shape[0] > 0:
-            return g.idxmin()
-
     rt = 0
     if precip_ts.any():
-        rt = (
-            precip_ts.resample(HOURLY)
-            .apply(get_idxmin)
-            .dropna()
-            .dt.minute.value_counts()
-            .idxmax()
-        )
-    return rt
+        rt = _reset_minute_counts(precip_ts).idxmax()
+    if freq is None:
+        return rt
+
+    minutes = _hourly_low_minutes(precip_ts, wet_only=True)
+    periods = pandas.Grouper(freq=freq, label="left", closed="left")
+    counts = minutes.groupby([periods, minutes]).size()
+    # most common minute of each period, ties go to the earliest minute
+    modes = counts.sort_values(ascending=False, kind="stable").groupby(level=0).head(1)
+    modes = pandas.Series(
+        modes.index.get_level_values(1), index=modes.index.get_level_values(0)
+    ).sort_index()
+    resets = modes.reindex(precip_ts.index, method="ffill").bfill().fillna(rt)
+    return resets.to_numpy(dtype=int)
+
+
+def _hourly_low_minutes(precip_ts, wet_only=False):
+    """Finds the minute of every hour with the lowest raw accumulation
+    (i.e., the first of the lowest values, like `Series.idxmin`).
+
+    Parameters
+    ----------
+    precip_ts : pandas.Series
+        Time series of the raw precipitation data.
+    wet_only : bool (default is False)
+        Only include the hours in which the accumulation changed.
+
+    Returns
+    -------
+    minutes : pandas.Series
+        Indexed by the start of each hour with data.
+    """
+
+    values = precip_ts.to_numpy(dtype=float)
+    hours = precip_ts.index.floor("h").asi8
+    rows = numpy.flatnonzero(~numpy.isnan(values))
+    # sort by hour, then value, then position, so the first row of each hour
+    # holds its lowest value and the last its highest
+    rows = rows[numpy.lexsort((rows, values[rows], hours[rows]))]
+    _, first = numpy.unique(hours[rows], return_index=True)
+    lows = rows[first]
+    if wet_only and rows.size:
+        highs = rows[numpy.append(first[1:], rows.shape[0]) - 1]
+        lows = lows[values[highs] > values[lows]]
+
+    index = precip_ts.index[lows]
+    return pandas.Series(index.minute, index=index.floor("h"))
+
+
+def _reset_minute_counts(precip_ts):
+    """Counts how often each minute of the hour holds the lowest hourly
+    accumulation in the raw precipitation data.
+    """
+    return _hourly_low_minutes(precip_ts).value_counts()
 
 
 def _process_precip(data, rt, raw_precipcol):
@@ -273,8 +990,9 @@ def _process_precip(data, rt, raw_precipcol):
     Parameters
     ----------
     data : pandas.DataFrame
-    rt : int
-        Minute of the hour at which the gauge's hourly accumulation is reset
+    rt : int or array of int
+        Minute of the hour at which the gauge's hourly accumulation is reset,
+        either for the whole record or at each of its timestamps.
     raw_precipcol : str
         Label of the column in `data` that contains the raw (hourly acummulated)
         precipitation data.
@@ -292,7 +1010,7 @@ def _process_precip(data, rt, raw_precipcol):
         .assign(d1=lambda df: df["rp"].diff())
     )
 
-    is_reset = df.index.minute == rt
+    is_reset = df.index.minute == numpy.asarray(rt)
     neg_diff = df["d1"] < 0
     first_in_chunk = df["d1"].isnull() & ~df["rp"].isnull()
     precip = numpy.where(
@@ -301,96 +1019,1561 @@ def _process_precip(data, rt, raw_precipcol):
     return precip
 
 
-def parse_file(filepath, new_precipcol="precipitation"):
-    """Parses a raw ASOS/METAR file into a pandas.DataFrame
+def _valid_metar_days(days):
+    """The metar library guesses the month of an observation from today's
+    date, so it fails on days that don't exist in the guessed month (e.g.,
+    the 31st). This flags the days of the month it can handle.
+    """
+    today = datetime.datetime.now(datetime.timezone.utc)
+    last_month = today.replace(day=1) - datetime.timedelta(days=1)
+    return (days >= 1) & ((days <= today.day) | (days <= last_month.day))
+
+
+def _metar_temperature(values):
+    temp = values.str.lstrip("M").astype(float)
+    return temp.where(~values.str.startswith("M", na=False), -temp)
+
+
+def _remark_temperature(sign, values):
+    temp = values.astype(float) / 10.0
+    return temp.where(sign != "1", -temp)
+
+
+class ParseDiagnostics:
+    """Tally of the problems found while decoding a raw ASOS file
+
+    Attributes
+    ----------
+    lines : int
+        Number of lines read from the file.
+    decoded : int
+        Number of lines decoded by the metar library. That's all of them with
+        ``engine="metar"``, but only the non-standard lines with "fast".
+    errors : int
+        Number of lines the metar library couldn't parse at all.
+    warnings : collections.Counter
+        Number of lines whose decoding stopped early, by the name of the
+        metar library's handler that failed (e.g., "_handleTime"), and of
+        lines with groups that weren't recognized ("unparsed").
+    unparsed_groups : collections.Counter
+        How often each unrecognized group was found, not counting the
+        standard parts of the ASOS lines that the metar library ignores.
+    samples : dict of lists
+        Up to `max_samples` lines with each kind of problem.
+
+    """
+
+    max_samples = 5
+
+    def __init__(self):
+        self.lines = 0
+        self.decoded = 0
+        self.errors = 0
+        self.warnings = collections.Counter()
+        self.unparsed_groups = collections.Counter()
+        self.samples = {}
+
+    def __repr__(self):
+        return (
+            f"ParseDiagnostics(lines={self.lines}, decoded={self.decoded}, "
+            f"errors={self.errors}, warnings={dict(self.warnings)})"
+        )
+
+    def __bool__(self):
+        return bool(self.errors or self.warnings)
+
+    def _sample(self, kind, line):
+        samples = self.samples.setdefault(kind, [])
+        if len(samples) < self.max_samples:
+            samples.append(line.rstrip("\n"))
+
+    def _record(self, line, obs):
+        """Adds the outcome of decoding *line* into the `MetarParser` *obs*
+        (None if it couldn't be parsed).
+        """
+        self.decoded += 1
+        if obs is None:
+            self.errors += 1
+            self._sample("error", line)
+            return
+
+        if obs._failed_handler is not None:
+            self.warnings[obs._failed_handler] += 1
+            self._sample(obs._failed_handler, line)
+        unparsed = [g for g in obs._unparsed_groups if not _ROUTINE_GROUP_RE.match(g)]
+        if unparsed:
+            self.warnings["unparsed"] += 1
+            self.unparsed_groups.update(unparsed)
+            self._sample("unparsed", line)
+
+
+# NaT as nanoseconds since the epoch
+_NAT = numpy.datetime64("NaT").astype(numpy.int64)
+
+
+class _ObsColumns:
+    """Decoded observations written straight into typed numpy arrays that
+    grow as rows are appended.
 
     Parameters
     ----------
-    filepath : str or pathlib.Path object of the METAR file
-    new_precipcol : str
-        The desired column label of the precipitation column after it has been
-        disaggregated from hourly accumulations
+    fields : sequence of str
+        The fields of `Obs` (other than the datetime) that are collected.
+    capacity : int (default is 1024)
+        Number of rows allocated up front.
+
+    """
+
+    def __init__(self, fields, capacity=1024):
+        self.fields = tuple(fields)
+        self.size = 0
+        # nanoseconds since the epoch
+        self._datetime = numpy.empty(capacity, dtype=numpy.int64)
+        self._values = numpy.empty((len(self.fields), capacity), dtype=float)
+        self._no_sky = numpy.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        capacity = max(2 * self._datetime.shape[0], 1)
+        extra = capacity - self._datetime.shape[0]
+        self._datetime = numpy.append(self._datetime, numpy.empty(extra, numpy.int64))
+        self._values = numpy.append(
+            self._values, numpy.empty((len(self.fields), extra)), axis=1
+        )
+        self._no_sky = numpy.append(self._no_sky, numpy.zeros(extra, dtype=bool))
+
+    def append(self, timestamp, obs):
+        """Adds a row for the epoch-nanosecond *timestamp* decoded from the
+        `MetarParser` *obs*, or a blank row if either is missing.
+        """
+        if self.size == self._datetime.shape[0]:
+            self._grow()
+
+        row = self.size
+        self.size += 1
+        if obs is None or timestamp == _NAT:
+            self._datetime[row] = _NAT
+            self._values[:, row] = numpy.nan
+            return
+
+        self._datetime[row] = timestamp
+        for n, field in enumerate(self.fields):
+            value = _DECODERS[field](obs)
+            if field == "sky_cover" and isinstance(value, str):
+                self._no_sky[row] = True
+                value = numpy.nan
+            self._values[n, row] = value
+
+    def arrays(self):
+        """Returns the datetimes, a dict of the value arrays, and a mask of
+        the rows without any sky layers.
+        """
+        datetimes = self._datetime[: self.size].view("M8[ns]")
+        values = {f: self._values[n, : self.size] for n, f in enumerate(self.fields)}
+        return datetimes, values, self._no_sky[: self.size]
+
+
+def _obs_frame(datetimes, values, no_sky, fields):
+    columns = {"datetime": datetimes, **values}
+    if no_sky.any():
+        columns["sky_cover"] = columns["sky_cover"].astype(object)
+        columns["sky_cover"][no_sky] = "NA"
+    return pandas.DataFrame(columns, columns=["datetime", *fields])
+
+
+def _header_datetimes(buf, starts, lengths):
+    """Converts the "mm/dd/yy HH:MM:SS" timestamps in columns 28 to 45 of
+    the lines in a byte buffer to nanoseconds since the epoch, rounded to
+    5-minutes, without decoding the lines.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray of uint8
+        The raw bytes.
+    starts, lengths : numpy.ndarray of int
+        Offset of each line in *buf* and its length, including the newline.
 
     Returns
     -------
-    df : pandas.DataFrame
+    datetimes : numpy.ndarray of int64
+        NaT for the lines without a valid timestamp.
 
     """
 
-    def _do_parse(x):
-        try:
-            return MetarParser(x, strict=False).asos_dict()
-        except Metar.ParserError:
-            return {}
+    datetimes = numpy.full(starts.shape[0], _NAT, dtype=numpy.int64)
+    rows = numpy.flatnonzero(lengths > 45)
+    chars = buf[starts[rows, None] + numpy.arange(28, 45)].astype(numpy.int64)
+    digits = chars[:, [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16]] - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= (chars[:, [2, 5, 8, 11, 14]] == [ord(c) for c in "// ::"]).all(axis=1)
 
-    with filepath.open("r") as rawf:
-        df = pandas.DataFrame(list(map(_do_parse, rawf)))
+    month, day, year, hour, minute, second = (digits[:, 0::2] * 10 + digits[:, 1::2]).T
+    # like strptime's %y
+    year = year + numpy.where(year < 69, 2000, 1900)
+    months = (year - 1970) * 12 + month - 1
+    days = months.astype("M8[M]").astype("M8[D]").astype(numpy.int64) + day - 1
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    valid &= days.astype("M8[D]").astype("M8[M]").astype(numpy.int64) == months
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
 
-    if not df.empty:
-        data = df.groupby("datetime").last().sort_index().resample(FIVEMIN).asfreq()
+    # round to 5-minutes with ties to even, like `pandas.Timestamp.round`
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+    periods, remainder = numpy.divmod(seconds, 300)
+    periods += (remainder > 150) | ((remainder == 150) & (periods % 2 == 1))
+    datetimes[rows[valid]] = periods[valid] * 300 * 10**9
+    return datetimes
 
-        rt = _find_reset_time(data["raw_precipitation"])
-        precip = _process_precip(data, rt, "raw_precipitation")
-        return data.assign(**{new_precipcol: precip})
 
+def _line_datetimes(lines):
+    """Converts the timestamps in columns 28 to 45 of raw lines to
+    nanoseconds since the epoch, rounded to 5-minutes, all at once.
+    """
+    lengths = numpy.fromiter(map(len, lines), dtype=numpy.int64, count=len(lines))
+    buf = numpy.frombuffer("".join(lines).encode("ascii", "replace"), numpy.uint8)
+    return _header_datetimes(buf, numpy.cumsum(lengths) - lengths, lengths)
 
-def get_data(
-    station_id,
-    startdate,
-    stopdate,
-    email,
-    folder=".",
-    raw_folder="01-raw",
-    force_download=False,
-    pbar_fxn=None,
-):
-    """Download and process a range of FAA/ASOS data files for a given station
+
+class _RawFile:
+    """A raw ASOS file mapped into memory. The lines and the timestamps in
+    their headers are found with numpy over the raw bytes, and lines are only
+    decoded when they're asked for.
+
+    Compressed files (".gz" or ".zst") can't be mapped, so they're
+    decompressed into memory as they're read instead.
 
     Parameters
     ----------
-    station_id : str
-        The station ID/airport code of the gauge
-    startdate, stopdate : str or datetime-like
-        Pandas `Timestamp` or other datetime-like objects with `.year` and
-        `.month` attributes representing the date range (inclusive) of data
-        to be downloaded
-    email : str
-        Your email address to be used as the ftp login password
-    folder : str or pathlib.Path
-        Top-level folder to store all of the transferred ftp data
-    raw_folder : pathlib.Path
-        Directory on the local file system where the data should be saved
-    force_download : bool (default is False)
-        See to the True to force re-downloading of data that already exists
-        in the folder specified structure.
-    pbar_fxn : callable, optional
-        A tqdm-like progress bar function such as `tqdm.tqdm` or
-        `tqdm.tqdm_notebook`.
+    filepath : str or pathlib.Path
 
-    Returns
-    -------
-    weather : pandas.DataFrame
+    Attributes
+    ----------
+    starts, lengths : numpy.ndarray of int
+        Offset of each line and its length, including the newline.
+    datetimes : numpy.ndarray of int64
+        The timestamp of each line in nanoseconds since the epoch, rounded to
+        5-minutes. See `_header_datetimes`.
 
-    Examples
-    --------
-    >>> from cloudside import asos
-    >>> from tqdm import tqdm
-    >>> pdx = asos.get_data('KPDX', '2013-09-01', '2013-10-31', 'iamweather@sensors.net',
-    ...                     folder='Portland_weather', raw_folder='asos_files',
-    ...                     force_download=False, pbar_fxn=tqdm)
     """
 
+    def __init__(self, filepath):
+        with validate.open_raw(filepath, "rb") as rawf:
+            if validate.compression_of(filepath) is not None:
+                self._map = rawf.read()
+                size = len(self._map)
+            else:
+                size = rawf.seek(0, 2)
+                # mapping an empty file is an error
+                self._map = (
+                    mmap.mmap(rawf.fileno(), 0, access=mmap.ACCESS_READ)
+                    if size
+                    else b""
+                )
+
+        buf = numpy.frombuffer(self._map, dtype=numpy.uint8)
+        ends = numpy.flatnonzero(buf == ord("\n")) + 1
+        if size and (not ends.size or ends[-1] != size):
+            ends = numpy.append(ends, size)
+        self.starts = numpy.append(0, ends[:-1]) if ends.size else ends
+        self.lengths = ends - self.starts
+        self.datetimes = _header_datetimes(buf, self.starts, self.lengths)
+        # numpy holds on to the map while it has a view of it
+        del buf
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.starts.shape[0]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def _bytes(self, rows):
+        return [
+            self._map[s : s + n] for s, n in zip(self.starts[rows], self.lengths[rows])
+        ]
+
+    def lines(self, keep=None):
+        """Decodes the lines (or only those flagged in *keep*) to str"""
+        rows = numpy.arange(len(self)) if keep is None else numpy.flatnonzero(keep)
+        return [line.decode("ascii", "replace") for line in self._bytes(rows)]
+
+    def duplicated(self):
+        """Flags the lines that repeat an earlier line exactly. Only the lines
+        with the same timestamp and length as another are compared.
+        """
+        same = pandas.DataFrame({"dt": self.datetimes, "n": self.lengths})
+        rows = numpy.flatnonzero(same.duplicated(keep=False).to_numpy())
+        duplicated = numpy.zeros(len(self), dtype=bool)
+        duplicated[rows] = pandas.Series(self._bytes(rows), dtype=object).duplicated()
+        return duplicated
+
+
+def _metar_columns(lines, fields, diagnostics=None, datetimes=None):
+    if datetimes is None:
+        datetimes = _line_datetimes(lines)
+    columns = _ObsColumns(fields, capacity=len(lines))
+    # `MetarParser` keeps track of the problems that the metar library warns
+    # about (see `ParseDiagnostics`), so the warnings themselves are just noise
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=RuntimeWarning, module="metar")
+        for line, timestamp in zip(lines, datetimes):
+            try:
+                obs = MetarParser(line, strict=False)
+            except Metar.ParserError:
+                obs = None
+            columns.append(timestamp, obs)
+            if diagnostics is not None:
+                diagnostics._record(line, obs)
+    return columns.arrays()
+
+
+def _parse_metar(lines, fields=None, diagnostics=None, datetimes=None):
+    """Decodes raw ASOS lines one at a time with `MetarParser`. Only the
+    requested *fields* (all of them by default) are decoded, and problems
+    are tallied in *diagnostics*. The lines' *datetimes* are found with
+    `_line_datetimes` if they're not provided.
+    """
+    fields = _resolve_fields(fields)
+    return _obs_frame(*_metar_columns(lines, fields, diagnostics, datetimes), fields)
+
+
+def _parse_fast(lines, fields=None, diagnostics=None, datetimes=None):
+    """Decodes raw ASOS lines into columns with regular expressions applied
+    over the whole file at once. Lines that don't follow the standard layout
+    are handed off to `MetarParser`. Only the requested *fields* (all of them
+    by default) are decoded.
+    """
+    if not lines:
+        return pandas.DataFrame()
+
+    fields = _resolve_fields(fields)
+    if datetimes is None:
+        datetimes = _line_datetimes(lines)
+
+    raw = pandas.Series(lines, dtype=object)
+    parts = raw.str.extract(_ASOS_LINE_RE)
+    remarks = parts["remarks"].fillna("")
+    wind_dir = pandas.to_numeric(parts["wind_dir"], errors="coerce")
+    is_fast = (
+        parts["datetime"].notnull()
+        & (datetimes != _NAT)
+        & _valid_metar_days(parts["day"].astype(float).fillna(0))
+        & ((parts["wind_dir"] == "VRB") | (wind_dir <= 360))
+        & (remarks.str.count("WND") == remarks.str.count(_PEAK_WIND_RE))
+        & (remarks.str.count("WSHFT") == remarks.str.count(_WIND_SHIFT_RE))
+    ).to_numpy()
+    fast = parts.loc[is_fast]
+    remarks = remarks.loc[is_fast]
+
+    n = raw.shape[0]
+    columns = {field: numpy.full(n, numpy.nan) for field in fields}
+    columns["datetime"] = numpy.full(n, numpy.datetime64("NaT"), dtype="M8[ns]")
+    columns["datetime"][is_fast] = datetimes[is_fast].view("M8[ns]")
+    if "raw_precipitation" in fields:
+        precip = remarks.str.extract(_PRECIP_1HR_RE)[0].astype(float) / 100.0
+        columns["raw_precipitation"][is_fast] = precip.to_numpy()
+    if "temperature" in fields or "dew_point" in fields:
+        temp_1hr = remarks.str.extract(_TEMP_1HR_RE)
+    if "temperature" in fields:
+        temp = _remark_temperature(temp_1hr[0], temp_1hr[1]).fillna(
+            _metar_temperature(fast["temp"])
+        )
+        columns["temperature"][is_fast] = temp.to_numpy()
+    if "dew_point" in fields:
+        dewpt = _remark_temperature(temp_1hr[2], temp_1hr[3]).fillna(
+            _metar_temperature(fast["dewpt"])
+        )
+        columns["dew_point"][is_fast] = dewpt.to_numpy()
+    if "wind_speed" in fields:
+        columns["wind_speed"][is_fast] = fast["wind_speed"].astype(float).to_numpy()
+    if "wind_direction" in fields:
+        columns["wind_direction"][is_fast] = wind_dir.loc[is_fast].to_numpy()
+    if "air_pressure" in fields:
+        press = fast["extra"].str.extract(_PRESS_RE)[0].astype(float)
+        press = press.where(press <= 2500, press / 100.0).fillna(
+            fast["altimeter"].astype(float) / 100.0
+        )
+        columns["air_pressure"][is_fast] = press.to_numpy()
+    no_sky = numpy.zeros(n, dtype=bool)
+    if "sky_cover" in fields:
+        cover = numpy.full(fast.shape[0], numpy.nan)
+        for code, value in _COVER.items():
+            has_layer = fast["sky"].str.contains(rf"(?:^|\s){code}").to_numpy()
+            cover = numpy.fmax(cover, numpy.where(has_layer, value, numpy.nan))
+        columns["sky_cover"][is_fast] = cover
+        no_sky[is_fast] = fast["sky"].str.strip().eq("").to_numpy()
+
+    slow = numpy.flatnonzero(~is_fast)
+    if slow.size:
+        slow_datetimes, values, slow_no_sky = _metar_columns(
+            [lines[row] for row in slow], fields, diagnostics, datetimes[slow]
+        )
+        columns["datetime"][slow] = slow_datetimes
+        for field in fields:
+            columns[field][slow] = values[field]
+        no_sky[slow] = slow_no_sky
+
+    return _obs_frame(columns.pop("datetime"), columns, no_sky, fields)
+
+
+def _get_parser(engine):
+    parsers = {"metar": _parse_metar, "fast": _parse_fast}
+    if engine not in parsers:
+        raise ValueError(f"engine must be one of {list(parsers)}, not {engine!r}")
+    return parsers[engine]
+
+
+def _compact(df, compact=True):
+    """Shrinks a parsed frame. Sky cover without any layers becomes NaN
+    instead of "NA" and every float column becomes float32. With
+    ``compact="category"``, sky cover and wind direction are stored as
+    categoricals (one byte per row) instead.
+    """
+    if compact not in (True, "category"):
+        raise ValueError(f"compact must be True, False, or 'category', not {compact!r}")
+
+    data = df.copy()
+    if "sky_cover" in data:
+        data["sky_cover"] = pandas.to_numeric(
+            data["sky_cover"].mask(data["sky_cover"].eq("NA"))
+        )
+
+    if compact == "category":
+        for col, categories in _CATEGORIES.items():
+            if col in data:
+                values = data[col]
+                data[col] = pandas.Categorical(values, categories=categories)
+                if (values.notnull() & data[col].isnull()).any():
+                    _logger.log(
+                        logging.WARNING, f"Dropped non-standard values of {col}"
+                    )
+
+    floats = data.select_dtypes("float64").columns
+    return data.astype(dict.fromkeys(floats, "float32"))
+
+
+def _time_window(start=None, stop=None):
+    """Converts a requested range of time to inclusive timestamps. Like
+    pandas does when slicing, a partial date string for *stop* runs through
+    the end of its period (e.g., "2013-09-20" includes all of that day).
+    """
+    lo = None if start is None else pandas.Timestamp(start)
+    if stop is None:
+        hi = None
+    elif isinstance(stop, str):
+        hi = pandas.Period(stop).end_time
+    else:
+        hi = pandas.Timestamp(stop)
+    return lo, hi
+
+
+def _prefilter(raw, lo=None, hi=None):
+    """Flags the lines of a `_RawFile` that are worth decoding: the ones
+    that don't repeat an earlier line and, going by the timestamps in their
+    headers, fall between *lo* and *hi*.
+    """
+    keep = ~raw.duplicated()
+    datetimes = raw.datetimes.view("M8[ns]")
+    if lo is not None:
+        keep &= datetimes >= lo.to_datetime64()
+    if hi is not None:
+        keep &= datetimes <= hi.to_datetime64()
+    return keep
+
+
+def parse_file(
+    filepath,
+    new_precipcol="precipitation",
+    engine="metar",
+    fields=None,
+    reset_freq=None,
+    compact=False,
+    start=None,
+    stop=None,
+    diagnostics=False,
+):
+    """Parses a raw ASOS/METAR file into a pandas.DataFrame
+
+    Parameters
+    ----------
+    filepath : str or pathlib.Path object of the METAR file
+        Plain files are mapped into memory. Compressed files (".gz" or
+        ".zst") can't be, so their whole decompressed contents are read into
+        memory first. Use `iter_parse` to parse large compressed files with
+        a bounded amount of memory.
+    new_precipcol : str
+        The desired column label of the precipitation column after it has been
+        disaggregated from hourly accumulations
+    engine : str (default is "metar")
+        Either "metar" to decode every line with the `metar` library, or
+        "fast" to decode the standard lines with vectorized regular expressions
+        and only use the `metar` library on the lines that don't fit.
+    fields : list of str, optional
+        The fields of `Obs` to decode (e.g., ``["raw_precipitation"]``). The
+        *new_precipcol* column is only included when "raw_precipitation" (or
+        *new_precipcol* itself) is requested. By default, every field is
+        decoded.
+    reset_freq : str or pandas offset, optional
+        Estimate the gauge's hourly reset time separately for every period of
+        this length (e.g., "D") instead of once for the whole file. Use this
+        for gauges whose reset time changes within a month.
+    compact : bool or "category" (default is False)
+        Return a smaller frame: float32 columns and NaN instead of "NA" for
+        sky cover without any layers. With "category", sky cover and wind
+        direction are also stored as categoricals.
+    start, stop : str or datetime-like, optional
+        Only return the data in this (inclusive) range of time. Lines outside
+        of it are skipped before they're decoded.
+    diagnostics : bool (default is False)
+        Also return a `ParseDiagnostics` with the problems found in the file.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    diag : ParseDiagnostics
+        Only if *diagnostics* is True.
+
+    """
+
+    fields = _resolve_fields(fields, new_precipcol)
+    lo, hi = _time_window(start, stop)
+    diag = ParseDiagnostics()
+    with _RawFile(filepath) as raw:
+        diag.lines = len(raw)
+        # keep the hour before the window so that the hourly precip
+        # accumulation at its start can be disaggregated
+        keep = _prefilter(raw, None if lo is None else lo - HOURLY, hi)
+        lines = raw.lines(keep)
+        datetimes = raw.datetimes[keep]
+    df = _get_parser(engine)(lines, fields, diag, datetimes)
+    if diag:
+        _logger.log(logging.INFO, f"Problems parsing {filepath}: {diag}")
+
+    data = None
+    if not df.empty:
+        data = df.groupby("datetime").last().sort_index().resample(FIVEMIN).asfreq()
+        if "raw_precipitation" in fields:
+            rt = _find_reset_time(data["raw_precipitation"], freq=reset_freq)
+            precip = _process_precip(data, rt, "raw_precipitation")
+            data = data.assign(**{new_precipcol: precip})
+        data = data.loc[lo:hi]
+        if compact:
+            data = _compact(data, compact)
+
+    if diagnostics:
+        return data, diag
+    return data
+
+
+def iter_parse(
+    filepath,
+    chunksize=100_000,
+    new_precipcol="precipitation",
+    engine="metar",
+    fields=None,
+    compact=False,
+):
+    """Parses a raw ASOS/METAR file into a series of pandas.DataFrames
+    without ever holding the whole file in memory
+
+    Parameters
+    ----------
+    filepath : str or pathlib.Path object of the METAR file
+        Compressed files (".gz" or ".zst") are decompressed as they're read,
+        one chunk at a time.
+    chunksize : int (default is 100,000)
+        Number of lines read from the file at a time.
+    new_precipcol : str
+        The desired column label of the precipitation column after it has been
+        disaggregated from hourly accumulations
+    engine : str (default is "metar")
+        The parser used to decode the lines. See `parse_file`.
+    fields : list of str, optional
+        The fields of `Obs` to decode. See `parse_file`.
+    compact : bool or "category" (default is False)
+        Yield smaller frames. See `parse_file`.
+
+    Yields
+    ------
+    df : pandas.DataFrame
+        Consecutive chunks of the 5-minute record. Concatenated, they're the
+        same as the output of `parse_file`, except that the gauge's reset time
+        is estimated from the data read so far rather than the whole file.
+
+    Notes
+    -----
+    The lines of the file are assumed to be in chronological order, as they
+    are in the files from the NCEI. Observations that are older than what has
+    already been yielded are dropped.
+
+    """
+
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be a positive integer, not {chunksize}")
+
+    fields = _resolve_fields(fields, new_precipcol)
+    parser = partial(_get_parser(engine), fields=fields)
+    reset_counts = pandas.Series(dtype=float)
+    carry = None  # observations in the last (possibly incomplete) hour read
+    last = None  # last row yielded, needed to difference the precip data
+
+    with validate.open_raw(filepath, "r") as rawf:
+        while True:
+            lines = list(itertools.islice(rawf, chunksize))
+            eof = len(lines) < chunksize
+            obs = parser(lines)
+            if not obs.empty:
+                obs = obs.loc[obs["datetime"].notnull()]
+            obs = pandas.concat([carry, obs]) if carry is not None else obs
+            if obs.empty:
+                if eof:
+                    break
+                continue
+
+            if not eof:
+                cutoff = obs["datetime"].max().floor("h")
+                ready = obs.loc[obs["datetime"] < cutoff]
+                carry = obs.loc[obs["datetime"] >= cutoff]
+            else:
+                ready, carry = obs, None
+
+            if not ready.empty:
+                data = ready.groupby("datetime").last().sort_index()
+                if last is not None:
+                    if (data.index <= last.index[-1]).any():
+                        _logger.log(
+                            logging.WARNING, f"Dropped out-of-order rows in {filepath}"
+                        )
+                    data = data.loc[data.index > last.index[-1]]
+                    start = last.index[-1] + FIVEMIN
+                else:
+                    start = data.index[0]
+                index = pandas.date_range(start, data.index[-1], freq=FIVEMIN)
+                data = data.reindex(index.rename("datetime"))
+                previous, last = last, data.iloc[-1:]
+                if "raw_precipitation" in fields:
+                    rp = data[["raw_precipitation"]]
+                    if rp["raw_precipitation"].any():
+                        counts = _reset_minute_counts(rp["raw_precipitation"])
+                        reset_counts = reset_counts.add(counts, fill_value=0)
+                    rt = 0 if reset_counts.empty else reset_counts.idxmax()
+
+                    if previous is not None:
+                        rp = pandas.concat([previous[["raw_precipitation"]], rp])
+                    precip = _process_precip(rp, rt, "raw_precipitation")
+                    data = data.assign(**{new_precipcol: precip[-data.shape[0] :]})
+                yield _compact(data, compact) if compact else data
+
+            if carry is None:
+                break
+
+
+def _write_parquet(df, path):
+    """Writes a parsed frame to a Parquet file, replacing the file only once
+    it has been completely written.
+    """
+    data = df.copy()
+    # parquet can't mix the "NA" strings of the sky cover column with floats
+    for col in df.columns[df.dtypes == object]:
+        is_na = df[col].eq("NA")
+        data[col] = pandas.to_numeric(df[col].mask(is_na))
+        data[f"{col}:NA"] = is_na
+    # nor does it keep the categories of numeric categoricals, so only the
+    # codes are stored
+    for col in df.columns[df.dtypes == "category"]:
+        data[col] = df[col].cat.codes
+        data = data.rename(columns={col: f"{col}:category"})
+
+    tmp_path = path.with_name(path.name + ".part")
+    data.to_parquet(tmp_path)
+    tmp_path.replace(path)
+
+
+def _read_parquet(path):
+    """Reads a frame written by `_write_parquet`"""
+    df = pandas.read_parquet(path)
+    for col in df.columns[df.columns.str.endswith(":NA")]:
+        is_na = df.pop(col).to_numpy()
+        data = df[col[:-3]].astype(object)
+        data[is_na] = "NA"
+        df[col[:-3]] = data
+    for col in df.columns[df.columns.str.endswith(":category")]:
+        name = col[: -len(":category")]
+        df[col] = pandas.Categorical.from_codes(df[col], categories=_CATEGORIES[name])
+        df = df.rename(columns={col: name})
+    df.index.freq = FIVEMIN
+    return df
+
+
+class ParseCache:
+    """On-disk cache of the frames returned by `parse_file`, stored as one
+    Parquet file per raw file.
+
+    Cached frames are keyed on the size and modification time of the raw
+    file, the `PARSER_VERSION`, and the options passed to `parse_file`, so
+    stale entries are never used once any of those change.
+
+    Parameters
+    ----------
+    folder : str or pathlib.Path
+        Directory where the parsed frames are stored.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of lookups that were and weren't found in the cache.
+
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (
+            f"ParseCache({str(self.folder)!r}, hits={self.hits}, misses={self.misses})"
+        )
+
+    @staticmethod
+    def _digest(key):
+        key = json.dumps(key, default=str)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _prefix(self, raw_file, **parse_opts):
+        # the options get their own digest so that the entries of one set of
+        # options can be replaced without touching the others
+        options = self._digest(sorted(parse_opts.items()))
+        return f"{Path(raw_file).stem}-{options}"
+
+    def _path(self, raw_file, **parse_opts):
+        stat = Path(raw_file).stat()
+        state = self._digest([PARSER_VERSION, stat.st_size, stat.st_mtime_ns])
+        prefix = self._prefix(raw_file, **parse_opts)
+        return self.folder.joinpath(f"{prefix}-{state}.parquet")
+
+    def get(self, raw_file, **parse_opts):
+        """Returns the cached frame for *raw_file* or None if there isn't one"""
+        path = self._path(raw_file, **parse_opts)
+        if not path.exists():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return _read_parquet(path)
+
+    def put(self, raw_file, df, **parse_opts):
+        """Stores the parsed frame of *raw_file*, replacing older entries
+        that were parsed with the same options
+        """
+        prefix = self._prefix(raw_file, **parse_opts)
+        for path in self.folder.glob(f"{prefix}-*.parquet"):
+            path.unlink()
+        if df is not None:
+            _write_parquet(df, self._path(raw_file, **parse_opts))
+
+    def invalidate(self, raw_file=None):
+        """Removes the cached frames of *raw_file*, or of every file if it's
+        not provided.
+        """
+        pattern = f"{Path(raw_file).stem}-*.parquet" if raw_file else "*.parquet"
+        for path in self.folder.glob(pattern):
+            path.unlink()
+
+
+def _parse_file_or_error(raw_file, **parse_opts):
+    try:
+        return parse_file(raw_file, **parse_opts)
+    except Exception as err:
+        return err
+
+
+def _iter_parsed(
+    raw_files,
+    workers=None,
+    cache=None,
+    return_exceptions=False,
+    catalog=None,
+    **parse_opts,
+):
+    """Parses raw files as they come out of the *raw_files* iterable,
+    optionally across a pool of processes and skipping any that are in the
+    *cache*, and yields (raw_file, frame) pairs as they're done.
+
+    No more than twice as many files as there are *workers* are handed to the
+    pool at once, so a slow pool holds back the iterable rather than piling
+    up work. With *return_exceptions*, the error raised while parsing a file
+    is yielded in place of its frame. The outcome of each file that was
+    parsed is recorded in the *catalog*.
+    """
+    parser = partial(
+        _parse_file_or_error if return_exceptions else parse_file, **parse_opts
+    )
+
+    def finish(rf, df):
+        if cache is not None and not isinstance(df, Exception):
+            cache.put(rf, df, **parse_opts)
+        if catalog is not None:
+            catalog.record_parse(rf, _parse_status(df))
+        return rf, df
+
+    def cached(rf):
+        return None if cache is None else cache.get(rf, **parse_opts)
+
+    if workers is None or workers <= 1:
+        for rf in raw_files:
+            df = cached(rf)
+            yield (rf, df) if df is not None else finish(rf, parser(rf))
+    else:
+        # the fetching threads of `_fetch_and_parse` are already running, and
+        # forking a process with threads in it can leave its locks held
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as pool:
+            pending = {}
+            for rf in raw_files:
+                df = cached(rf)
+                if df is not None:
+                    yield rf, df
+                    continue
+
+                pending[pool.submit(parser, rf)] = rf
+                block = len(pending) >= 2 * workers
+                done, _ = wait(
+                    pending, timeout=None if block else 0, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    yield finish(pending.pop(future), future.result())
+
+            for future in as_completed(pending):
+                yield finish(pending[future], future.result())
+
+    if cache is not None:
+        _logger.log(logging.INFO, f"{cache}")
+
+
+def _parse_files(raw_files, pbar_fxn=None, **kwargs):
+    """Parses a sequence of raw files with `_iter_parsed` and returns the
+    parsed frames in the same order as the files.
+    """
+    raw_files = list(raw_files)
+    parsed = validate.progress_bar(
+        pbar_fxn,
+        _iter_parsed(raw_files, **kwargs),
+        desc="Parsing",
+        total=len(raw_files),
+    )
+    frames = dict(parsed)
+    return [frames[rf] for rf in raw_files]
+
+
+def _fetch_and_parse(
+    email,
+    jobs,
+    raw_folder,
+    connections=1,
+    pbar_fxn=None,
+    force_download=False,
+    compression=None,
+    catalog=None,
+    **parse_kwargs,
+):
+    """Fetches the files of the (station_id, timestamp) *jobs* and parses
+    them, handing each file to the parsers as soon as it lands so that
+    downloading and parsing overlap.
+
+    Finished downloads wait in a queue of limited size, so the downloads
+    are held back while the parsers are behind. Unless *return_exceptions*
+    is passed on to `_iter_parsed`, the first download that fails stops
+    everything.
+
+    Returns
+    -------
+    fetched : dict
+        The path, None, or error that fetching each job ended with.
+    parsed : dict
+        The frame (or error, see `_iter_parsed`) of each path that was
+        fetched.
+
+    """
+
+    connections = max(1, min(connections, MAX_CONNECTIONS))
+    workers = parse_kwargs.get("workers") or 1
+    with _FTPPool(email, size=connections) as pool:
+        known, to_fetch = _plan_fetches(catalog, jobs, pool, force_download)
+
+        def fetch(job):
+            station_id, ts = job
+            return pool.fetch(
+                station_id,
+                ts,
+                raw_folder,
+                force_download=force_download,
+                compression=compression,
+                catalog=catalog,
+            )
+
+        fetched = dict(known)
+        downloads = validate.progress_bar(
+            pbar_fxn,
+            _iter_fetched(fetch, to_fetch, connections, maxsize=2 * workers),
+            desc="Fetching",
+            total=len(to_fetch),
+        )
+
+        def landed():
+            yield from known.values()
+            for job, result in downloads:
+                fetched[job] = result
+                if isinstance(result, Exception):
+                    if not parse_kwargs.get("return_exceptions"):
+                        raise result
+                elif result is not None:
+                    yield result
+
+        parsed = dict(
+            validate.progress_bar(
+                pbar_fxn,
+                _iter_parsed(landed(), catalog=catalog, **parse_kwargs),
+                desc="Parsing",
+            )
+        )
+    return fetched, parsed
+
+
+def _parse_status(df):
+    if isinstance(df, Exception):
+        return f"error: {df!r}"
+    elif df is None:
+        return "empty"
+    return "ok"
+
+
+@contextmanager
+def _open_catalog(catalog, raw_folder):
+    """Provides the `RawCatalog` that a *catalog* argument asks for. A
+    catalog that's opened here (for ``catalog=True``) is closed afterwards,
+    while one that was passed in is left open for the caller.
+    """
+    if catalog is None or isinstance(catalog, RawCatalog):
+        yield catalog
+    elif catalog:
+        with RawCatalog(raw_folder) as opened:
+            yield opened
+    else:
+        yield None
+
+
+def get_data(
+    station_id,
+    startdate,
+    stopdate,
+    email,
+    folder=".",
+    raw_folder="01-raw",
+    force_download=False,
+    pbar_fxn=None,
+    engine="metar",
+    workers=None,
+    connections=1,
+    cache=None,
+    fields=None,
+    reset_freq=None,
+    compact=False,
+    compression=None,
+    catalog=False,
+):
+    """Download and process a range of FAA/ASOS data files for a given station
+
+    Parameters
+    ----------
+    station_id : str
+        The station ID/airport code of the gauge
+    startdate, stopdate : str or datetime-like
+        Pandas `Timestamp` or other datetime-like objects representing the
+        date range (inclusive) of data to be returned. Every month that
+        overlaps it is downloaded. A date string for *stopdate* includes
+        the whole day.
+    email : str
+        Your email address to be used as the ftp login password
+    folder : str or pathlib.Path
+        Top-level folder to store all of the transferred ftp data
+    raw_folder : pathlib.Path
+        Directory on the local file system where the data should be saved
+    force_download : bool (default is False)
+        See to the True to force re-downloading of data that already exists
+        in the folder specified structure.
+    pbar_fxn : callable, optional
+        A tqdm-like progress bar function such as `tqdm.tqdm` or
+        `tqdm.tqdm_notebook`.
+    engine : str (default is "metar")
+        The parser used to decode the raw files. See `parse_file`.
+    workers : int, optional
+        Number of processes used to parse the raw files. By default, the files
+        are parsed one after another in the current process.
+    connections : int (default is 1)
+        Number of FTP sessions used to download files concurrently. See
+        `fetch_files`.
+    cache : str, pathlib.Path, or ParseCache, optional
+        Cache of previously parsed files. Paths are relative to *folder*.
+        Requires pyarrow. Without a cache, only the lines between *startdate*
+        and *stopdate* are decoded. With one, whole months are decoded and
+        cached, so that they can be reused for other windows.
+    fields : list of str, optional
+        The fields of `Obs` to decode (e.g., ``["raw_precipitation"]``). See
+        `parse_file`.
+    reset_freq : str or pandas offset, optional
+        Estimate the gauge's reset time for every period of this length. See
+        `parse_file`.
+    compact : bool or "category" (default is False)
+        Return a smaller frame with float32 columns and, optionally,
+        categorical sky cover and wind direction. See `parse_file`.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the raw files compressed. Existing raw files are used whether
+        they're compressed or not. See `_fetch_file`.
+    catalog : bool or RawCatalog (default is False)
+        Keep track of the raw files in a `RawCatalog` (by default, the one in
+        *raw_folder*) so that files that were already downloaded are checked
+        against one listing of the server per year without looking at them,
+        and unchanged files aren't downloaded again.
+
+    Returns
+    -------
+    weather : pandas.DataFrame
+
+    Examples
+    --------
+    >>> from cloudside import asos
+    >>> from tqdm import tqdm
+    >>> pdx = asos.get_data('KPDX', '2013-09-01', '2013-10-31', 'iamweather@sensors.net',
+    ...                     folder='Portland_weather', raw_folder='asos_files',
+    ...                     force_download=False, pbar_fxn=tqdm)
+    """
+
+    # whole months are downloaded, starting with the one that holds startdate
+    lo, hi = _time_window(startdate, stopdate)
     _raw_folder = Path(folder).joinpath(raw_folder)
     _raw_folder.mkdir(parents=True, exist_ok=True)
-    _raw_files = fetch_files(
-        station_id,
-        startdate,
-        stopdate,
-        email,
-        raw_folder=_raw_folder,
-        pbar_fxn=pbar_fxn,
-        force_download=force_download,
-    )
-    raw_files = validate.progress_bar(pbar_fxn, _raw_files, desc="Parsing")
-    df = pandas.concat([parse_file(rf) for rf in raw_files])
-    return df.pipe(validate.unique_index)
+    if cache is not None and not isinstance(cache, ParseCache):
+        cache = ParseCache(Path(folder).joinpath(cache))
+    # with a cache, whole months are parsed (and cached) so that moving the
+    # window doesn't change what's in it. Otherwise, only the lines in the
+    # window are decoded.
+    window = {} if cache is not None else {"start": lo, "stop": hi}
+
+    dates = pandas.date_range(lo.to_period("M").to_timestamp(), hi, freq=MONTHLY)
+    jobs = [(station_id, ts) for ts in dates]
+    with _open_catalog(catalog, _raw_folder) as catalog:
+        fetched, parsed = _fetch_and_parse(
+            email,
+            jobs,
+            _raw_folder,
+            connections=connections,
+            pbar_fxn=pbar_fxn,
+            force_download=force_download,
+            compression=compression,
+            catalog=catalog,
+            workers=workers,
+            cache=cache,
+            engine=engine,
+            fields=_resolve_fields(fields),
+            reset_freq=reset_freq,
+            compact=compact,
+            **window,
+        )
+    raw_files = [fetched[job] for job in jobs if fetched[job] is not None]
+    df = pandas.concat([parsed[rf] for rf in raw_files])
+    return df.pipe(validate.unique_index).loc[lo:hi]
+
+
+def get_data_many(
+    station_ids,
+    startdate,
+    stopdate,
+    email,
+    folder=".",
+    raw_folder="01-raw",
+    force_download=False,
+    pbar_fxn=None,
+    engine="metar",
+    workers=None,
+    connections=1,
+    cache=None,
+    fields=None,
+    reset_freq=None,
+    compact=False,
+    compression=None,
+    catalog=False,
+    as_dict=False,
+):
+    """Download and process a range of FAA/ASOS data files for several
+    stations at once
+
+    All of the files are downloaded over one pool of FTP sessions and parsed
+    in one batch, and a station that can't be downloaded or parsed doesn't
+    stop the others.
+
+    Parameters
+    ----------
+    station_ids : list of str
+        The station IDs/airport codes of the gauges
+    startdate, stopdate : str or datetime-like
+        Pandas `Timestamp` or other datetime-like objects representing the
+        date range (inclusive) of data to be returned. Every month that
+        overlaps it is downloaded. A date string for *stopdate* includes
+        the whole day.
+    email : str
+        Your email address to be used as the ftp login password
+    as_dict : bool (default is False)
+        Return a dict of each station's frame instead of one long frame.
+
+    See `get_data` for the rest of the parameters.
+
+    Returns
+    -------
+    weather : pandas.DataFrame or dict of pandas.DataFrame
+        The data of every station that succeeded, indexed by
+        (station, datetime) unless *as_dict* is True.
+    errors : dict of Exception
+        The error that stopped each station that failed. Stations with
+        errors are left out of *weather* entirely.
+
+    Examples
+    --------
+    >>> from cloudside import asos
+    >>> weather, errors = asos.get_data_many(['KPDX', 'KSEA'], '2013-09-01',
+    ...                                      '2013-10-31', 'iamweather@sensors.net',
+    ...                                      folder='PNW_weather', connections=4)
+    """
+
+    station_ids = list(dict.fromkeys(station_ids))
+    _raw_folder = Path(folder).joinpath(raw_folder)
+    _raw_folder.mkdir(parents=True, exist_ok=True)
+
+    lo, hi = _time_window(startdate, stopdate)
+    dates = pandas.date_range(lo.to_period("M").to_timestamp(), hi, freq=MONTHLY)
+    jobs = [(station_id, ts) for station_id in station_ids for ts in dates]
+    if cache is not None and not isinstance(cache, ParseCache):
+        cache = ParseCache(Path(folder).joinpath(cache))
+    # with a cache, whole months are parsed (and cached) so that moving the
+    # window doesn't change what's in it. Otherwise, only the lines in the
+    # window are decoded.
+    window = {} if cache is not None else {"start": lo, "stop": hi}
+    with _open_catalog(catalog, _raw_folder) as catalog:
+        fetched, parsed = _fetch_and_parse(
+            email,
+            jobs,
+            _raw_folder,
+            connections=connections,
+            pbar_fxn=pbar_fxn,
+            force_download=force_download,
+            compression=compression,
+            catalog=catalog,
+            workers=workers,
+            cache=cache,
+            return_exceptions=True,
+            engine=engine,
+            fields=_resolve_fields(fields),
+            reset_freq=reset_freq,
+            compact=compact,
+            **window,
+        )
+
+    errors = {}
+    raw_files = []
+    for station_id, ts in jobs:
+        result = fetched[(station_id, ts)]
+        if isinstance(result, Exception):
+            errors.setdefault(station_id, result)
+        elif result is not None:
+            raw_files.append((station_id, result))
+    to_parse = [(sta, rf) for sta, rf in raw_files if sta not in errors]
+    parsed = [parsed[rf] for _, rf in to_parse]
+
+    frames = {station_id: [] for station_id in station_ids}
+    for (station_id, _), df in zip(to_parse, parsed):
+        if isinstance(df, Exception):
+            errors.setdefault(station_id, df)
+        elif df is not None:
+            frames[station_id].append(df)
+
+    data = {}
+    for station_id in station_ids:
+        if station_id not in errors and not frames[station_id]:
+            errors[station_id] = ValueError(f"No data found for {station_id}")
+        if station_id in errors:
+            _logger.log(
+                logging.ERROR, f"Failed to get {station_id}: {errors[station_id]!r}"
+            )
+        else:
+            data[station_id] = (
+                pandas.concat(frames[station_id]).pipe(validate.unique_index).loc[lo:hi]
+            )
+
+    if as_dict:
+        return data, errors
+    elif not data:
+        index = pandas.MultiIndex.from_arrays([[], []], names=["station", "datetime"])
+        return pandas.DataFrame(index=index), errors
+    return pandas.concat(data, names=["station", "datetime"]), errors
+
+
+def _store_path(station_id, folder=".", store_folder="03-store"):
+    return Path(folder).joinpath(store_folder, station_id)
+
+
+def read_store(station_id, folder=".", store_folder="03-store"):
+    """Reads the full record of a station from the store maintained by
+    `update`
+
+    Requires pyarrow.
+
+    Parameters
+    ----------
+    station_id : str
+        The station ID/airport code of the gauge
+    folder : str or pathlib.Path
+        Top-level folder of the station's data
+    store_folder : str or pathlib.Path
+        Subdirectory of *folder* that holds the store
+
+    Returns
+    -------
+    weather : pandas.DataFrame or None
+        None if nothing has been stored for the station.
+
+    """
+
+    months = sorted(_store_path(station_id, folder, store_folder).glob("*.parquet"))
+    if months:
+        return pandas.concat(map(_read_parquet, months)).pipe(validate.unique_index)
+
+
+def update(
+    station_id,
+    email,
+    startdate=None,
+    stopdate=None,
+    folder=".",
+    raw_folder="01-raw",
+    store_folder="03-store",
+    trailing=1,
+    pbar_fxn=None,
+    compression=None,
+    catalog=False,
+    **parse_opts,
+):
+    """Brings a persistent, per-station store of parsed ASOS data up to date
+
+    The store holds one Parquet file per month. Only the last *trailing*
+    months in the store (which may have been incomplete when they were
+    stored) and any newer months are downloaded and parsed again. Older
+    months are left as they are. Requires pyarrow.
+
+    Parameters
+    ----------
+    station_id : str
+        The station ID/airport code of the gauge
+    email : str
+        Your email address to be used as the ftp login password
+    startdate : str or datetime-like, optional
+        Start of the record. Only needed the first time a station is
+        stored.
+    stopdate : str or datetime-like, optional
+        End of the record. Defaults to today.
+    folder : str or pathlib.Path
+        Top-level folder to store all of the transferred ftp data
+    raw_folder, store_folder : str or pathlib.Path
+        Subdirectories of *folder* where the raw files and the store are saved
+    trailing : int (default is 1)
+        Number of the most recently stored months that are refreshed.
+    pbar_fxn : callable, optional
+        A tqdm-like progress bar function such as `tqdm.tqdm` or
+        `tqdm.tqdm_notebook`.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the raw files compressed. See `_fetch_file`.
+    catalog : bool or RawCatalog (default is False)
+        Keep track of the raw files in a `RawCatalog`, so that refreshed
+        months that haven't changed on the server aren't downloaded again.
+        See `get_data`.
+    parse_opts
+        Options passed on to `parse_file` (e.g., ``engine="fast"``).
+
+    Returns
+    -------
+    weather : pandas.DataFrame
+        The full record of the station in the store.
+
+    Examples
+    --------
+    >>> from cloudside import asos
+    >>> pdx = asos.update('KPDX', 'iamweather@sensors.net', startdate='2013-09-01',
+    ...                   folder='Portland_weather')
+
+    """
+
+    store = _store_path(station_id, folder, store_folder)
+    store.mkdir(parents=True, exist_ok=True)
+    months = sorted(store.glob("*.parquet"))
+    if months:
+        startdate = pandas.Timestamp(months[-1].stem) - MONTHLY * (trailing - 1)
+    elif startdate is None:
+        raise ValueError(f"startdate is required to start a store for {station_id}")
+
+    # `fetch_files` only includes months that start on or after `startdate`
+    startdate = pandas.Timestamp(startdate).to_period("M").to_timestamp()
+    stopdate = pandas.Timestamp("today") if stopdate is None else stopdate
+
+    _raw_folder = Path(folder).joinpath(raw_folder)
+    _raw_folder.mkdir(parents=True, exist_ok=True)
+    with _open_catalog(catalog, _raw_folder) as catalog:
+        raw_files = list(
+            fetch_files(
+                station_id,
+                startdate,
+                stopdate,
+                email,
+                raw_folder=_raw_folder,
+                force_download=bool(months),
+                pbar_fxn=pbar_fxn,
+                compression=compression,
+                catalog=catalog,
+            )
+        )
+        frames = _parse_files(
+            raw_files, pbar_fxn=pbar_fxn, catalog=catalog, **parse_opts
+        )
+    for raw_file, df in zip(raw_files, frames):
+        if df is not None:
+            month = pandas.Timestamp(Path(raw_file).name.split(".")[0][-6:] + "01")
+            _write_parquet(df, store.joinpath(f"{month:%Y-%m}.parquet"))
+
+    return read_store(station_id, folder, store_folder)
+
+
+def _fetch_tail(station_id, timestamp, ftp, raw_folder, listing=None):
+    """Brings a local copy of a raw file up to date by only downloading the
+    bytes that were added to the remote file since it was last fetched.
+
+    Returns
+    -------
+    dst_path : pathlib.Path or None
+        None if the file isn't on the server.
+    restarted : bool
+        True if the remote file no longer starts with the local copy (it
+        shrank), so the whole file was downloaded again.
+
+    """
+
+    ftpfolder, src_name = _remote_file(station_id, timestamp)
+    dst_path = Path(raw_folder).joinpath(src_name)
+    stored = validate.stored_file(dst_path)
+    if stored is not None and stored != dst_path:
+        raise ValueError(f"Can't append to the compressed raw file {stored}")
+
+    if listing is not None and src_name not in listing:
+        _logger.log(logging.ERROR, f"No such file {src_name}")
+        return None, False
+
+    offset = dst_path.stat().st_size if stored is not None else 0
+    remote_size = None if listing is None else listing.get(src_name)
+    if remote_size is None:
+        remote_size = _remote_size(ftp, f"{ftpfolder}/{src_name}")
+    if remote_size is None and not offset:
+        # there's nothing to resume, and no size means no file
+        _logger.log(logging.ERROR, f"No such file {src_name}")
+        return None, False
+
+    restarted = remote_size is not None and remote_size < offset
+    if restarted:
+        offset = 0
+        dst_path.unlink()
+    if remote_size is not None and remote_size == offset:
+        return dst_path, restarted
+
+    with dst_path.open(mode="ab") as dst_obj:
+        ftp.retrbinary(
+            f"RETR {ftpfolder}/{src_name}",
+            dst_obj.write,
+            blocksize=BLOCKSIZE,
+            rest=offset or None,
+        )
+    return dst_path, restarted
+
+
+def _read_tail_state(path=None):
+    if path is not None and path.exists():
+        return json.loads(path.read_text())
+    return {"size": 0, "offset": 0, "reset_counts": {}, "previous": None}
+
+
+def _write_tail_state(path, state):
+    tmp_path = path.with_name(path.name + ".part")
+    tmp_path.write_text(json.dumps(state, default=str))
+    tmp_path.replace(path)
+
+
+def tail(
+    station_id,
+    email,
+    month=None,
+    folder=".",
+    raw_folder="01-raw",
+    store_folder="03-store",
+    new_precipcol="precipitation",
+    engine="metar",
+    fields=None,
+    compact=False,
+):
+    """Incrementally brings the current month of a station's store up to
+    date, for near-real-time monitoring
+
+    Only the bytes that were added to the raw file on the ftp server since
+    the last call are downloaded (with the ftp ``REST`` command) and only the
+    lines from the last, possibly incomplete, hour onwards are parsed. Those
+    rows replace the end of the month in the store maintained by `update`.
+    Requires pyarrow.
+
+    Parameters
+    ----------
+    station_id : str
+        The station ID/airport code of the gauge
+    email : str
+        Your email address to be used as the ftp login password
+    month : str or datetime-like, optional
+        Any time in the month to follow. Defaults to the current month.
+    folder : str or pathlib.Path
+        Top-level folder to store all of the transferred ftp data
+    raw_folder, store_folder : str or pathlib.Path
+        Subdirectories of *folder* where the raw files and the store are saved
+    new_precipcol, engine, fields, compact
+        Options of the parser. See `parse_file`.
+
+    Returns
+    -------
+    recent : pandas.DataFrame or None
+        The rows that were added to (or replaced in) the store. None if
+        there's nothing new.
+
+    Notes
+    -----
+    Where the last call left off is kept next to the month in the store, in
+    "YYYY-MM.tail.json": the size of the raw file that was read, the byte
+    offset of the first line of the last hour that was parsed, the count of
+    the minutes at which the gauge reset in the hours before it (see
+    `iter_parse`), and the last raw precipitation value before it. Delete the
+    file to parse the whole month again.
+
+    The raw file is appended to as it is, so it can't be stored compressed.
+
+    Examples
+    --------
+    >>> from cloudside import asos
+    >>> recent = asos.tail('KPDX', 'iamweather@sensors.net', folder='Portland_weather')
+
+    """
+
+    month = pandas.Timestamp("today" if month is None else month)
+    month = month.to_period("M").to_timestamp()
+    fields = _resolve_fields(fields, new_precipcol)
+    store = _store_path(station_id, folder, store_folder)
+    store.mkdir(parents=True, exist_ok=True)
+    store_file = store.joinpath(f"{month:%Y-%m}.parquet")
+    state_file = store.joinpath(f"{month:%Y-%m}.tail.json")
+    _raw_folder = Path(folder).joinpath(raw_folder)
+    _raw_folder.mkdir(parents=True, exist_ok=True)
+
+    with _FTPPool(email) as pool:
+        with pool.session() as ftp:
+            ftpfolder, _ = _remote_file(station_id, month)
+            listing = pool.listing(ftp, ftpfolder)
+            raw_file, restarted = _fetch_tail(
+                station_id, month, ftp, _raw_folder, listing=listing
+            )
+    if raw_file is None:
+        return None
+
+    resume = store_file.exists() and not restarted
+    state = _read_tail_state(state_file if resume else None)
+
+    with raw_file.open("rb") as rawf:
+        rawf.seek(state["offset"])
+        buf = rawf.read()
+    if state["offset"] + len(buf) == state["size"]:
+        return None
+    state["size"] = state["offset"] + len(buf)
+    # a line that's still being written is left for the next call
+    lines = buf[: buf.rfind(b"\n") + 1].decode("ascii", "replace")
+    lines = lines.splitlines(keepends=True)
+    datetimes = _line_datetimes(lines)
+    obs = _get_parser(engine)(lines, fields, None, datetimes)
+    previous = state["previous"]
+    if not obs.empty:
+        keep = obs["datetime"].notnull()
+        if previous is not None:
+            keep &= obs["datetime"] > pandas.Timestamp(previous["datetime"])
+        obs = obs.loc[keep]
+    if obs.empty:
+        _write_tail_state(state_file, state)
+        return None
+
+    data = obs.groupby("datetime").last().sort_index()
+    if previous is not None:
+        start = pandas.Timestamp(previous["datetime"]) + FIVEMIN
+    else:
+        start = data.index[0]
+    index = pandas.date_range(start, data.index[-1], freq=FIVEMIN)
+    data = data.reindex(index.rename("datetime"))
+
+    # the last hour may be incomplete, so it's parsed again next time
+    cutoff = data.index[-1].floor("h")
+    done = data.loc[data.index < cutoff]
+    reset_counts = pandas.Series(state["reset_counts"], dtype=float)
+    reset_counts.index = reset_counts.index.astype(int)
+    if "raw_precipitation" in fields:
+        if done["raw_precipitation"].any():
+            counts = _reset_minute_counts(done["raw_precipitation"])
+            reset_counts = reset_counts.add(counts, fill_value=0)
+        rt = 0 if reset_counts.empty else reset_counts.idxmax()
+
+        rp = data[["raw_precipitation"]]
+        if previous is not None:
+            last = pandas.DataFrame(
+                {"raw_precipitation": [previous["raw_precipitation"]]},
+                index=[pandas.Timestamp(previous["datetime"])],
+                dtype=float,
+            )
+            rp = pandas.concat([last, rp])
+        precip = _process_precip(rp, rt, "raw_precipitation")
+        data = data.assign(**{new_precipcol: precip[-data.shape[0] :]})
+    if compact:
+        data = _compact(data, compact)
+
+    if previous is not None:
+        stored = _read_parquet(store_file)
+        data = pandas.concat([stored.loc[stored.index < data.index[0]], data])
+    _write_parquet(data, store_file)
+
+    if not done.empty:
+        carried = numpy.flatnonzero(datetimes >= cutoff.value)
+        first = carried[0] if carried.size else len(lines)
+        state = {
+            "size": state["size"],
+            "offset": state["offset"] + sum(map(len, lines[:first])),
+            "reset_counts": reset_counts.to_dict(),
+            "previous": {
+                "datetime": done.index[-1],
+                "raw_precipitation": (
+                    None
+                    if "raw_precipitation" not in fields
+                    or pandas.isnull(done["raw_precipitation"].iloc[-1])
+                    else float(done["raw_precipitation"].iloc[-1])
+                ),
+            },
+        }
+    _write_tail_state(state_file, state)
+    return data.loc[index[0] :]
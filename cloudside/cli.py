@@ -24,7 +24,8 @@ def main():
 @click.option("--folder")
 @click.option("--force", is_flag=True)
 @click.option("--outfile")
-def get_asos(station, startdate, enddate, email, folder, force, outfile):
+@click.option("--jobs", type=int)
+def get_asos(station, startdate, enddate, email, folder, force, outfile, jobs):
     folder = "." or folder
     df = asos.get_data(
         station,
@@ -34,6 +35,7 @@ def get_asos(station, startdate, enddate, email, folder, force, outfile):
         folder=folder,
         force_download=force,
         pbar_fxn=tqdm,
+        workers=jobs,
     )
     if outfile:
         df.to_csv(outfile, encoding="utf-8")
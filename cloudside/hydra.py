@@ -1,67 +1,193 @@
+import hashlib
+import io
+import json
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import numpy
 import pandas
 import requests
 
 from cloudside import validate
 
+HYDRA_URL = "https://or.water.usgs.gov/non-usgs/bes/{}.rain"
+# be polite to the USGS server
+MAX_CONNECTIONS = 8
+# size of the chunks written to disk during downloads
+BLOCKSIZE = 2**20
+# each tip of a gauge's bucket is 0.01 inches of rain
+TIPS_PER_INCH = 100
+
+_logger = logging.getLogger(__name__)
+
+_READ_OPTS = {
+    "sep": r"\s+",
+    "header": None,
+    "parse_dates": ["Date"],
+    "na_values": ["-"],
+    "date_format": "%d-%b-%Y",
+}
+
+
+def _fetch_file(
+    station_id, raw_folder, force_download=False, compression=None, session=None
+):
+    """Downloads a gauge's rain file from the Hydra Network, unless the copy
+    already on the local file system is still current.
+
+    Parameters
+    ----------
+    station_id : string
+        Short name of the rain gauge.
+    raw_folder : string or pathlib.Path
+        Directory on the local file system where the data should be saved.
+    force_download : bool (default is False)
+        Download the file even if the server says that it hasn't changed.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the file compressed (as ".txt.gz" or ".txt.zst").
+    session : requests.Session, optional
+        Session whose pooled connections are used for the request.
+
+    Returns
+    -------
+    dst_path : pathlib.Path
+
+    Notes
+    -----
+    The ETag and Last-Modified headers of each download are saved next to the
+    file (in "<station>.http.json") and sent back with the next request, so
+    that an unchanged file only costs a "304 Not Modified" response. The body
+    is streamed to disk in blocks and never held in memory as a whole.
+
+    """
 
-def _fetch_file(station_id, raw_folder, force_download=False):
     sta = station_id.lower()
-    url = "https://or.water.usgs.gov/non-usgs/bes/{}.rain".format(sta)
-    dst_path = Path(raw_folder).joinpath(sta + ".txt")
-    dst_path.write_text(requests.get(url).text)
+    url = HYDRA_URL.format(sta)
+    raw_folder = Path(raw_folder)
+    dst_path = raw_folder.joinpath(sta + ".txt" + validate.compression(compression))
+    validators_path = raw_folder.joinpath(sta + ".http.json")
+    stored = validate.stored_file(raw_folder.joinpath(sta + ".txt"))
+
+    headers = {"Accept-Encoding": "gzip"}
+    if stored is not None and validators_path.exists() and not force_download:
+        validators = json.loads(validators_path.read_text())
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    http = requests if session is None else session
+    with http.get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            return stored
+        response.raise_for_status()
+
+        # the file is only replaced once it has been completely downloaded
+        tmp_path = raw_folder.joinpath(sta + ".part" + dst_path.name[len(sta) :])
+        with validate.open_raw(tmp_path, "wb") as dst:
+            for block in response.iter_content(chunk_size=BLOCKSIZE):
+                dst.write(block)
+        tmp_path.replace(dst_path)
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    validators_path.write_text(json.dumps(validators))
+
+    # don't leave a stale copy of the file stored another way
+    for suffix in validate.COMPRESSION_SUFFIXES.values():
+        other = raw_folder.joinpath(sta + ".txt" + suffix)
+        if other != dst_path:
+            other.unlink(missing_ok=True)
     return dst_path
 
 
-def parse_file(filepath):
+def parse_file(filepath, tips=False):
     """Parses a rain file downloaded from the Portland Hydra Network
 
     Parameters
     ----------
     filepath : string or pathlib.Path
-        Object representing the downloaded file
+        Object representing the downloaded file. Files ending in ".gz" or
+        ".zst" are decompressed as they're read.
+    tips : bool (default is False)
+        Keep the raw number of tips of the gauge's bucket as nullable 16-bit
+        integers ("Int16") instead of converting them to inches. This takes
+        3 bytes per hour instead of 8 and sums are exact. Use
+        `tips_to_depth` to convert them later.
 
     Returns
     -------
     rain_df : pandas.DataFrame
-        Dataframe with the hourly rainfall depth in inches. The column label
-        will be the station's name. The index is set to the hourly timestamps.
+        Dataframe with the hourly rainfall depth in inches (or number of
+        tips). The column label will be the station's name. The index is set
+        to the hourly timestamps.
 
     """
 
-    read_opts = {
-        "sep": r"\s+",
-        "header": None,
-        "parse_dates": ["Date"],
-        "na_values": ["-"],
-        "date_format": "%d-%b-%Y",
-    }
-
-    with Path(filepath).open("r") as fr:
+    filepath = Path(filepath)
+    station = filepath.name.split(".")[0]
+    with validate.open_raw(filepath, "r") as fr:
         for line in fr:
             if line.strip().startswith("Daily"):
                 headers = next(fr).strip().split()
                 _ = next(fr)
-                df = (
-                    pandas.read_table(fr, names=headers, **read_opts)
-                    .drop(columns=["Total"])
-                    .melt(id_vars=["Date"], value_name=filepath.stem, var_name="Hour")
-                    .assign(
-                        Hour=lambda df: df["Hour"]
-                        .astype(int)
-                        .map(lambda x: pandas.Timedelta(x, unit="h"))
-                    )
-                    .assign(datetime=lambda df: df["Date"] + df["Hour"])
-                    .set_index("datetime")
-                    .sort_index()
-                    .loc[:, [filepath.stem]]
-                    .div(100)
-                )
-    return df
+                table = pandas.read_table(fr, names=headers, **_READ_OPTS)
+
+    return _rain_frame(table, station, tips=tips)
+
+
+def _rain_frame(table, station, tips=False):
+    """Reshapes the table of daily rows of hourly tip counts into an hourly
+    series of rainfall depths (or tip counts)"""
 
+    # one row of 24 hours per day, newest day first
+    hours = table.columns.drop(["Date", "Total"])
+    dates = table["Date"].to_numpy(dtype="datetime64[ns]")
+    order = numpy.argsort(dates, kind="stable")
+    counts = table[hours].to_numpy(dtype=float)[order].ravel()
+    offsets = hours.astype(int).to_numpy() * numpy.timedelta64(1, "h")
+    index = pandas.DatetimeIndex(
+        (dates[order, None] + offsets).ravel(), name="datetime"
+    )
+    if tips:
+        missing = numpy.isnan(counts)
+        counts[missing] = 0
+        values = pandas.arrays.IntegerArray(counts.astype(numpy.int16), missing)
+    else:
+        values = counts / TIPS_PER_INCH
+    return pandas.DataFrame({station: values}, index=index)
 
-def get_data(station_id, folder=".", raw_folder="01-raw", force_download=False):
+
+def tips_to_depth(rain_df):
+    """Converts hourly numbers of tips (see `parse_file`) to rainfall depths
+    in inches
+
+    Parameters
+    ----------
+    rain_df : pandas.DataFrame or pandas.Series
+        Numbers of tips, with missing values as ``pandas.NA``.
+
+    Returns
+    -------
+    rain_df : pandas.DataFrame or pandas.Series
+        Rainfall depths in inches as floats, with missing values as NaN.
+
+    """
+    return rain_df.astype(float) / TIPS_PER_INCH
+
+
+def get_data(
+    station_id,
+    folder=".",
+    raw_folder="01-raw",
+    force_download=False,
+    compression=None,
+    tips=False,
+):
     """Download and parse full records from Portland's Hydra Network
 
     Parameters
@@ -80,12 +206,17 @@ def get_data(station_id, folder=".", raw_folder="01-raw", force_download=False):
     force_download : bool (default is False)
         See to the True to force re-downloading of data that already exists
         in the folder specified structure.
+    compression : {None, "gzip", "zstd"}, optional
+        Store the raw file compressed (as ".txt.gz" or ".txt.zst").
+    tips : bool (default is False)
+        Return the raw numbers of tips instead of inches. See `parse_file`.
 
     Returns
     -------
     rain_df : pandas.DataFrame
-        Dataframe with the hourly rainfall depth in inches. The column label
-        will be the *station_id*. The index is set to the hourly timestamps.
+        Dataframe with the hourly rainfall depth in inches (or number of
+        tips). The column label will be the *station_id*. The index is set to
+        the hourly timestamps.
 
     See also
     --------
@@ -97,5 +228,295 @@ def get_data(station_id, folder=".", raw_folder="01-raw", force_download=False):
 
     _raw_folder = Path(folder).joinpath(raw_folder)
     _raw_folder.mkdir(parents=True, exist_ok=True)
-    _raw_path = _fetch_file(station_id, _raw_folder, force_download=force_download)
-    return parse_file(_raw_path).pipe(validate.unique_index)
+    _raw_path = _fetch_file(
+        station_id,
+        _raw_folder,
+        force_download=force_download,
+        compression=compression,
+    )
+    return parse_file(_raw_path, tips=tips).pipe(validate.unique_index)
+
+
+def _session(connections):
+    """A session that keeps up to *connections* connections to the server
+    open between requests."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=connections
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _fetch_file_or_error(station_id, raw_folder, **kwargs):
+    try:
+        return _fetch_file(station_id, raw_folder, **kwargs)
+    except Exception as err:
+        return err
+
+
+def _parse_file_or_error(raw_path, tips=False):
+    try:
+        return parse_file(raw_path, tips=tips).pipe(validate.unique_index)
+    except Exception as err:
+        return err
+
+
+def get_data_many(
+    station_ids,
+    folder=".",
+    raw_folder="01-raw",
+    force_download=False,
+    compression=None,
+    connections=4,
+    workers=None,
+    pbar_fxn=None,
+    tips=False,
+):
+    """Download and parse the full records of several gauges of Portland's
+    Hydra Network at once
+
+    The files are downloaded concurrently over one pool of kept-alive
+    connections, and a gauge that can't be downloaded or parsed doesn't
+    stop the others.
+
+    Parameters
+    ----------
+    station_ids : list of str
+        Short names of the rain gauges. See `get_data`.
+    folder, raw_folder, force_download, compression, tips
+        See `get_data`.
+    connections : int (default is 4)
+        Number of files downloaded at once. This is capped at
+        `MAX_CONNECTIONS`.
+    workers : int, optional
+        Number of processes used to parse the files. By default, the files
+        are parsed one after another in the current process.
+    pbar_fxn : callable, optional
+        A tqdm-like progress bar function such as `tqdm.tqdm` or
+        `tqdm.tqdm_notebook`.
+
+    Returns
+    -------
+    rain_df : pandas.DataFrame
+        The hourly rainfall depth in inches (or number of tips) of every
+        gauge that succeeded, with one column per *station_id* on a shared,
+        regular hourly index.
+    errors : dict of Exception
+        The error that stopped each gauge that failed. Gauges with errors are
+        left out of *rain_df*.
+
+    Examples
+    --------
+    >>> from cloudside import hydra
+    >>> rain, errors = hydra.get_data_many(['beaumont', 'sauvies_island'],
+    ...                                    folder='Portland_rain')
+
+    """
+
+    station_ids = list(dict.fromkeys(station_ids))
+    _raw_folder = Path(folder).joinpath(raw_folder)
+    _raw_folder.mkdir(parents=True, exist_ok=True)
+
+    connections = max(1, min(connections, MAX_CONNECTIONS))
+    with _session(connections) as session, ThreadPoolExecutor(connections) as pool:
+        fetcher = partial(
+            _fetch_file_or_error,
+            raw_folder=_raw_folder,
+            force_download=force_download,
+            compression=compression,
+            session=session,
+        )
+        fetched = list(
+            validate.progress_bar(
+                pbar_fxn,
+                pool.map(fetcher, station_ids),
+                desc="Fetching",
+                total=len(station_ids),
+            )
+        )
+
+    errors = {
+        sta: result
+        for sta, result in zip(station_ids, fetched)
+        if isinstance(result, Exception)
+    }
+    to_parse = [
+        (sta, raw_path)
+        for sta, raw_path in zip(station_ids, fetched)
+        if sta not in errors
+    ]
+    raw_paths = [raw_path for _, raw_path in to_parse]
+    parser = partial(_parse_file_or_error, tips=tips)
+    if workers is None or workers <= 1:
+        parsed = map(parser, raw_paths)
+        parsed = list(validate.progress_bar(pbar_fxn, parsed, desc="Parsing"))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(
+                validate.progress_bar(
+                    pbar_fxn,
+                    pool.map(parser, raw_paths),
+                    desc="Parsing",
+                    total=len(raw_paths),
+                )
+            )
+
+    columns = {}
+    for (sta, _), df in zip(to_parse, parsed):
+        if isinstance(df, Exception):
+            errors[sta] = df
+        else:
+            columns[sta] = df.iloc[:, 0]
+
+    for sta, err in errors.items():
+        _logger.log(logging.ERROR, f"Failed to get {sta}: {err!r}")
+
+    if not columns:
+        return pandas.DataFrame(index=pandas.DatetimeIndex([], name="datetime")), errors
+    rain = pandas.concat(columns, axis="columns").asfreq("h")
+    return rain.rename_axis(index="datetime"), errors
+
+
+def _split_rows(data):
+    """Splits the raw bytes of a rain file into the column labels and the
+    bytes of the table's rows"""
+    match = re.search(rb"^[ \t]*Daily.*\n(.*)\n.*\n", data, flags=re.MULTILINE)
+    if match is None:
+        raise ValueError("no table of hourly data in the rain file")
+    return match.group(1).decode("ascii").split(), data[match.end() :]
+
+
+def _read_update_state(path):
+    state = {
+        "settled_size": 0,
+        "settled_sha256": None,
+        "last_date": None,
+        "tips": False,
+    }
+    if path.exists():
+        state.update(json.loads(path.read_text()))
+    return state
+
+
+def _read_stored_record(store_path, state):
+    """Reads the stored record that *state* describes, or returns None if
+    the store doesn't end on the state's last date (e.g., because it was
+    replaced or deleted after the state was written).
+    """
+    if not store_path.exists() or state["last_date"] is None:
+        return None
+    stored = pandas.read_parquet(store_path)
+    if stored.empty or stored.index[-1] != pandas.Timestamp(state["last_date"]):
+        return None
+    return stored
+
+
+def update(
+    station_id,
+    folder=".",
+    raw_folder="01-raw",
+    store_folder="03-store",
+    force_download=False,
+    compression=None,
+    tips=False,
+):
+    """Brings a persistent store of a Hydra Network gauge's parsed record
+    up to date, parsing only the days that are new since the last update
+
+    The rain files hold the full record of a gauge with the newest day
+    first, so each day's new rows are added to the top of the table. The
+    store remembers how many bytes at the bottom of the table were already
+    parsed along with their checksum. When those bytes are unchanged in the
+    refreshed file, only the rows above them are parsed (including the
+    previously newest day, which may have been incomplete). If they changed,
+    because the older data were revised upstream, the whole file is parsed
+    again. So is a store that doesn't end on the last date that was parsed
+    or that was written with a different *tips* option.
+
+    Requires pyarrow.
+
+    Parameters
+    ----------
+    station_id : string
+        Short name of the rain gauge. See `get_data`.
+    folder, raw_folder, force_download, compression, tips
+        See `get_data`.
+    store_folder : str or pathlib.Path
+        Subdirectory of *folder* where the parsed record is stored (as
+        ``<station>.parquet`` next to a small ``<station>.state.json``).
+
+    Returns
+    -------
+    rain_df : pandas.DataFrame
+        The full record of the gauge, as returned by `get_data`.
+
+    Examples
+    --------
+    >>> from cloudside import hydra
+    >>> rain = hydra.update('sauvies_island', folder='Portland_rain')
+
+    """
+
+    _raw_folder = Path(folder).joinpath(raw_folder)
+    _raw_folder.mkdir(parents=True, exist_ok=True)
+    raw_path = _fetch_file(
+        station_id,
+        _raw_folder,
+        force_download=force_download,
+        compression=compression,
+    )
+    station = raw_path.name.split(".")[0]
+
+    store = Path(folder).joinpath(store_folder)
+    store.mkdir(parents=True, exist_ok=True)
+    store_path = store / f"{station}.parquet"
+    state_path = store / f"{station}.state.json"
+    state = _read_update_state(state_path)
+
+    with validate.open_raw(raw_path) as fr:
+        headers, rows = _split_rows(fr.read())
+
+    size = state["settled_size"]
+    settled = memoryview(rows)[len(rows) - size :]
+    stored = None
+    if (
+        state["tips"] == tips
+        and 0 < size <= len(rows)
+        and hashlib.sha256(settled).hexdigest() == state["settled_sha256"]
+    ):
+        stored = _read_stored_record(store_path, state)
+
+    if stored is not None:
+        new_rows = rows[: len(rows) - size]
+    else:
+        _logger.log(logging.INFO, f"Parsing the full record of {station}")
+        new_rows = rows
+
+    if stored is None or new_rows.strip():
+        table = pandas.read_table(io.BytesIO(new_rows), names=headers, **_READ_OPTS)
+        rain = _rain_frame(table, station, tips=tips).pipe(validate.unique_index)
+        if stored is not None:
+            kept = stored.loc[stored.index < rain.index[0]]
+            rain = pandas.concat([kept, rain]).pipe(validate.unique_index)
+    else:
+        rain = stored
+
+    tmp_path = store_path.with_name(store_path.name + ".part")
+    rain.to_parquet(tmp_path)
+    tmp_path.replace(store_path)
+
+    # everything but the newest day, which is still being filled in
+    newest_end = rows.find(b"\n") + 1
+    settled = rows[newest_end:] if newest_end else b""
+    state = {
+        "settled_size": len(settled),
+        "settled_sha256": hashlib.sha256(settled).hexdigest(),
+        "last_date": rain.index.max(),
+        "tips": tips,
+    }
+    tmp_path = state_path.with_name(state_path.name + ".part")
+    tmp_path.write_text(json.dumps(state, default=str))
+    tmp_path.replace(state_path)
+    return rain
@@ -1,6 +1,10 @@
 import pathlib
 import tempfile
 import ftplib
+import socket
+import threading
+import time
+import warnings
 
 import numpy
 import pandas
@@ -9,8 +13,9 @@ from unittest import mock
 import pytest
 import numpy.testing as nptest
 import pandas.testing as pdtest
+from metar import Metar
 
-from cloudside import asos
+from cloudside import asos, validate
 from cloudside.tests import get_test_file  # noqa
 
 
@@ -82,10 +87,43 @@ def asos_metar():
     return asos.MetarParser(teststring, strict=False)
 
 
-def retr_error(cmd, action):
+def retr_error(cmd, action, **kwargs):
     raise ftplib.error_perm
 
 
+@pytest.fixture
+def ftp_server():
+    """Local stand-in for the NCEI ftp server with a couple of ASOS files"""
+    pytest.importorskip("pyftpdlib")
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as ftpdir:
+        for year, month in [(2016, 11), (2016, 12), (2017, 1), (2017, 3)]:
+            folder = pathlib.Path(ftpdir, f"pub/data/asos-fivemin/6401-{year}")
+            folder.mkdir(parents=True, exist_ok=True)
+            name = f"64010KPDX{year}{month:02d}.dat"
+            stamp = f"{month:02d}/08/{year % 100:02d}".encode("ascii")
+            folder.joinpath(name).write_bytes(
+                datpath.read_bytes().replace(b"01/08/17", stamp)
+            )
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_anonymous(ftpdir)
+        handler = type("Handler", (FTPHandler,), {"authorizer": authorizer})
+        server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.socket.getsockname()[:2]
+        with mock.patch.object(asos, "FTP_HOST", host):
+            with mock.patch.object(asos, "FTP_PORT", port):
+                yield server
+        server.close_all()
+        thread.join()
+
+
 def test_MetarParser_datetime(asos_metar):
     expected = pandas.Timestamp(year=2017, month=1, day=8, hour=9, minute=0, second=31)
     assert asos_metar.datetime == expected
@@ -108,6 +146,64 @@ def test_MetarParser_asos_dict(asos_metar):
     assert result == expected
 
 
+def test_MetarParser_asos_dict_fields(asos_metar):
+    result = asos_metar.asos_dict(["raw_precipitation", "sky_cover"])
+    dateval = pandas.Timestamp(year=2017, month=1, day=8, hour=9, minute=0, second=0)
+    expected = {"datetime": dateval, "raw_precipitation": 0.05, "sky_cover": 1.0}
+    assert result == expected
+
+
+def test__ObsColumns(asos_metar):
+    columns = asos._ObsColumns(["raw_precipitation", "sky_cover"], capacity=1)
+    stamp = pandas.Timestamp("2017-01-08 09:00").value
+    columns.append(stamp, asos_metar)
+    columns.append(stamp, None)
+    columns.append(stamp, asos.MetarParser("KPDX 081700Z 10023KT", strict=False))
+    datetimes, values, no_sky = columns.arrays()
+
+    assert columns.size == 3
+    nptest.assert_array_equal(
+        datetimes,
+        numpy.array(["2017-01-08T09:00", "NaT", "2017-01-08T09:00"], "M8[ns]"),
+    )
+    nptest.assert_array_equal(values["raw_precipitation"], [0.05, numpy.nan, numpy.nan])
+    nptest.assert_array_equal(values["sky_cover"], [1.0, numpy.nan, numpy.nan])
+    nptest.assert_array_equal(no_sky, [False, False, True])
+
+
+def test__line_datetimes():
+    lines = [
+        "24229KPDX PDX20170108090014901/08/17 09:02:31  5-MIN KPDX 081700Z\n",
+        "24229KPDX PDX20170108090014901/08/17 09:03:31",
+        "24229KPDX PDX20170108090014901/xx/17 09:03:31  5-MIN KPDX 081700Z\n",
+    ]
+    result = asos._line_datetimes(lines).view("M8[ns]")
+    expected = numpy.array(["2017-01-08T09:05", "NaT", "NaT"], dtype="M8[ns]")
+    nptest.assert_array_equal(result, expected)
+
+
+def test__header_datetimes_matches_pandas():
+    stamps = pandas.date_range("1999-12-31", "2024-03-01", periods=5000).strftime(
+        "%m/%d/%y %H:%M:%S"
+    )
+    stamps = list(stamps) + [
+        "02/29/16 00:02:30",
+        "02/29/17 00:02:30",
+        "12/31/99 23:57:30",
+        "13/01/17 00:00:00",
+        "01/01/17 24:00:00",
+        "01/01/17 00:60:00",
+        "01/01/17T00:00:00",
+        "01/00/17 00:00:00",
+    ]
+    lines = [f"24229KPDX PDX201701080900149{stamp}  5-MIN\n" for stamp in stamps]
+    expected = pandas.to_datetime(
+        pandas.Series(stamps), format="%m/%d/%y %H:%M:%S", errors="coerce"
+    ).dt.round("5min")
+    result = asos._line_datetimes(lines).view("M8[ns]")
+    nptest.assert_array_equal(result, expected.to_numpy())
+
+
 @pytest.mark.parametrize(
     ("exists", "force", "call_count"),
     [(True, True, 1), (True, False, 0), (False, True, 1), (False, False, 1)],
@@ -127,14 +223,88 @@ def test__fetch_file(ftp, exists, force, call_count, datestr):
             expected_path = std_path
 
         if expected_path is None:
-            ftp.retrlines.side_effect = retr_error
+            ftp.retrbinary.side_effect = retr_error
 
         dst_path = asos._fetch_file("KPDX", ts, ftp, rawdir, force_download=force)
         assert dst_path == expected_path
-        assert ftp.retrlines.call_count == call_count
+        assert ftp.retrbinary.call_count == call_count
+        assert not std_path.with_name(std_path.name + ".part").exists()
+
 
+@pytest.mark.parametrize("force", [True, False])
+def test__fetch_file_resumes(ftp_server, force):
+    ts = pandas.Timestamp("2017-01-01")
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as rawdir:
+        dst_path = pathlib.Path(rawdir).joinpath("64010KPDX201701.dat")
+        part_path = dst_path.with_name(dst_path.name + ".part")
+        part_path.write_bytes(b"junk" if force else datpath.read_bytes()[:500])
+
+        with asos._FTPPool("tester@cloudside.net") as pool:
+            with pool.session() as ftp:
+                with mock.patch.object(ftp, "retrbinary", wraps=ftp.retrbinary) as retr:
+                    result = asos._fetch_file(
+                        "KPDX", ts, ftp, rawdir, force_download=force
+                    )
+                    assert retr.call_args.kwargs["rest"] == (None if force else 500)
+
+        assert result == dst_path
+        assert not part_path.exists()
+        assert dst_path.read_bytes() == datpath.read_bytes()
 
-@mock.patch.object(ftplib.FTP, "retrlines")
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test__fetch_file_compression(ftp_server, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    ts = pandas.Timestamp("2017-01-01")
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as rawdir:
+        old_path = pathlib.Path(rawdir).joinpath("64010KPDX201701.dat")
+        old_path.write_bytes(b"old")
+        with asos._FTPPool("tester@cloudside.net") as pool:
+            with pool.session() as ftp:
+                # existing files are used as they are...
+                kept = asos._fetch_file(
+                    "KPDX", ts, ftp, rawdir, compression=compression
+                )
+                assert kept == old_path
+
+                # ...unless they're downloaded again
+                result = asos._fetch_file(
+                    "KPDX",
+                    ts,
+                    ftp,
+                    rawdir,
+                    compression=compression,
+                    force_download=True,
+                )
+
+        assert result.name == "64010KPDX201701.dat" + (
+            ".gz" if compression == "gzip" else ".zst"
+        )
+        assert [p.name for p in pathlib.Path(rawdir).iterdir()] == [result.name]
+        with validate.open_raw(result) as stored:
+            assert stored.read() == datpath.read_bytes()
+
+        pdtest.assert_frame_equal(
+            asos.parse_file(result, engine="fast"),
+            asos.parse_file(datpath, engine="fast"),
+        )
+        pdtest.assert_frame_equal(
+            pandas.concat(asos.iter_parse(result, chunksize=50, engine="fast")),
+            pandas.concat(asos.iter_parse(datpath, chunksize=50, engine="fast")),
+        )
+
+
+def test__fetch_file_bad_compression():
+    with pytest.raises(ValueError):
+        asos._fetch_file(
+            "KPDX", pandas.Timestamp("2017-01-01"), None, ".", compression="xz"
+        )
+
+
+@mock.patch.object(ftplib.FTP, "retrbinary")
 @mock.patch.object(ftplib.FTP, "login")
 def test_fetch_files(ftp_login, ftp_retr):
     with tempfile.TemporaryDirectory() as rawdir:
@@ -147,6 +317,130 @@ def test_fetch_files(ftp_login, ftp_retr):
         assert ftp_retr.call_count == 5
 
 
+@pytest.mark.parametrize("connections", [1, 3, 10])
+def test_fetch_files_pool(ftp_server, connections):
+    with tempfile.TemporaryDirectory() as rawdir:
+        raw_paths = list(
+            asos.fetch_files(
+                "KPDX",
+                "2016-10-01",
+                "2017-03-01",
+                "tester@cloudside.net",
+                rawdir,
+                connections=connections,
+            )
+        )
+        expected = ["201611", "201612", "201701", "201703"]
+        assert [p.name for p in raw_paths] == [f"64010KPDX{e}.dat" for e in expected]
+        assert sorted(p.name for p in pathlib.Path(rawdir).iterdir()) == [
+            p.name for p in raw_paths
+        ]
+        datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+        assert raw_paths[2].read_text() == datpath.read_text()
+
+
+@pytest.mark.parametrize("mlsd", [True, False])
+def test_fetch_files_listing(ftp_server, mlsd):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    home = pathlib.Path(ftp_server.handler.authorizer.get_home_dir("anonymous"))
+    commands = []
+    sendcmd = ftplib.FTP.sendcmd
+
+    def record(ftp, cmd):
+        if cmd.startswith("MLSD") and not mlsd:
+            raise ftplib.error_perm("500 Command not understood")
+        commands.append(cmd.split()[0])
+        return sendcmd(ftp, cmd)
+
+    with tempfile.TemporaryDirectory() as rawdir:
+        # same size as the remote file, and a shorter one
+        same = pathlib.Path(rawdir).joinpath("64010KPDX201611.dat")
+        same.write_bytes(b"x" * len(datpath.read_bytes()))
+        short = pathlib.Path(rawdir).joinpath("64010KPDX201612.dat")
+        short.write_bytes(b"short")
+        with mock.patch.object(ftplib.FTP, "sendcmd", autospec=True) as cmd:
+            cmd.side_effect = record
+            raw_paths = list(
+                asos.fetch_files(
+                    "KPDX", "2016-09-01", "2017-03-01", "tester@cloudside.net", rawdir
+                )
+            )
+
+        assert [p.name[9:15] for p in raw_paths] == [
+            "201611",
+            "201612",
+            "201701",
+            "201703",
+        ]
+        assert commands.count("MLSD" if mlsd else "NLST") == 2
+        # the months that don't exist remotely are never requested
+        assert commands.count("RETR") == (3 if mlsd else 2)
+        assert sorted(p.name for p in pathlib.Path(rawdir).iterdir()) == sorted(
+            p.name for p in raw_paths
+        )
+        remote = home.joinpath("pub/data/asos-fivemin/6401-2016", short.name)
+        assert short.read_bytes() == (remote.read_bytes() if mlsd else b"short")
+        assert same.read_bytes() != datpath.read_bytes()
+
+
+def test__FTPPool_reconnects(ftp_server):
+    ts = pandas.Timestamp("2016-11-01")
+    with tempfile.TemporaryDirectory() as rawdir:
+        with asos._FTPPool("tester@cloudside.net", size=1) as pool:
+            with pool.session() as ftp:
+                first = ftp
+            first.sock.shutdown(socket.SHUT_RDWR)  # simulate a dropped connection
+
+            with mock.patch.object(asos.time, "sleep") as sleep:
+                dst_path = pool.fetch("KPDX", ts, rawdir)
+            assert dst_path.exists()
+            sleep.assert_called_once_with(asos.RECONNECT_DELAY)
+            with pool.session() as ftp:
+                assert ftp is not first
+
+
+def test__FTPPool_backoff():
+    ts = pandas.Timestamp("2016-11-01")
+    with asos._FTPPool("tester@cloudside.net") as pool:
+        busy = ftplib.error_temp("421 Too many connections")
+        with mock.patch.object(pool, "_connect", side_effect=busy) as connect:
+            with mock.patch.object(asos.time, "sleep") as sleep:
+                with pytest.raises(ftplib.error_temp):
+                    pool.fetch("KPDX", ts, ".", max_attempts=9)
+        assert connect.call_count == 9
+        delays = [c.args[0] for c in sleep.call_args_list]
+        assert delays == [1, 2, 4, 8, 16, 32, 60, 60]
+
+        # a host that can't be found isn't tried again
+        unknown = socket.gaierror(-2, "Name or service not known")
+        with mock.patch.object(pool, "_connect", side_effect=unknown) as connect:
+            with mock.patch.object(asos.time, "sleep") as sleep:
+                with pytest.raises(socket.gaierror):
+                    pool.fetch("KPDX", ts, ".")
+        connect.assert_called_once()
+        sleep.assert_not_called()
+
+
+def test__FTPPool_local_errors(ftp_server):
+    ts = pandas.Timestamp("2016-11-01")
+    with tempfile.TemporaryDirectory() as topdir:
+        missing = pathlib.Path(topdir, "missing")
+        with asos._FTPPool("tester@cloudside.net") as pool:
+            # local errors aren't fixed by reconnecting, so they aren't retried
+            with mock.patch.object(asos.time, "sleep") as sleep:
+                with pytest.raises(FileNotFoundError):
+                    pool.fetch("KPDX", ts, missing)
+            sleep.assert_not_called()
+
+            # and sessions that saw an error aren't reused
+            with pytest.raises(ValueError):
+                with pool.session() as ftp:
+                    asos._fetch_file("KPDX", ts, ftp, topdir, compression="junk")
+            assert ftp.sock is None
+            with pool.session() as other:
+                assert other is not ftp
+
+
 @pytest.mark.parametrize(("all_na", "expected"), [(False, 55), (True, 0)])
 def test__find_reset_time(fake_rain_data, all_na, expected):
     if all_na:
@@ -156,6 +450,36 @@ def test__find_reset_time(fake_rain_data, all_na, expected):
     assert result == expected
 
 
+@pytest.fixture
+def shifting_rain_data():
+    # the gauge resets at :55 for the first two days and at :15 afterwards
+    index = pandas.date_range("2017-01-01", periods=12 * 24 * 4, freq="5min")
+    reset = numpy.where(index < "2017-01-03", 55, 15)
+    hour_of_reset = (index - pandas.to_timedelta(reset, unit="min")).floor("h")
+    return pandas.Series(0.01, index=index).groupby(hour_of_reset).cumsum()
+
+
+def test__find_reset_time_per_day(shifting_rain_data):
+    result = asos._find_reset_time(shifting_rain_data, freq="D")
+    expected = numpy.where(shifting_rain_data.index < "2017-01-03", 55, 15)
+    nptest.assert_array_equal(result, expected)
+
+
+def test__find_reset_time_per_day_dry_days(shifting_rain_data):
+    rain = shifting_rain_data.where(shifting_rain_data.index.day != 3, 0.0)
+    result = asos._find_reset_time(rain, freq="D")
+    # the dry day keeps the previous day's reset time
+    expected = numpy.where(rain.index < "2017-01-04", 55, 15)
+    nptest.assert_array_equal(result, expected)
+
+
+def test_process_precip_per_day(shifting_rain_data):
+    precip = shifting_rain_data.to_frame("raw_precip")
+    rt = asos._find_reset_time(shifting_rain_data, freq="D")
+    result = asos._process_precip(precip, rt, "raw_precip")
+    nptest.assert_array_almost_equal(result, numpy.full(precip.shape[0], 0.01))
+
+
 def test_process_precip(fake_rain_data):
     precip = fake_rain_data.to_frame("raw_precip")
     result = asos._process_precip(precip, 55, "raw_precip")
@@ -214,10 +538,11 @@ def test_process_precip(fake_rain_data):
     nptest.assert_array_almost_equal(result, expected)
 
 
-def test_parse_file():
+@pytest.mark.parametrize("engine", ["metar", "fast"])
+def test_parse_file(engine):
     datpath = pathlib.Path(get_test_file("sample_asos.dat"))
     csvpath = pathlib.Path(get_test_file("sample_asos.csv"))
-    result = asos.parse_file(datpath)
+    result = asos.parse_file(datpath, engine=engine)
     assert result is not None
     expected = (
         pandas.read_csv(csvpath, parse_dates=True, index_col=["datetime"])
@@ -230,6 +555,409 @@ def test_parse_file():
     )
 
 
+@pytest.mark.parametrize("engine", ["metar", "fast"])
+def test_iter_parse(engine):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    expected = asos.parse_file(datpath, engine=engine)
+    chunks = list(asos.iter_parse(datpath, chunksize=1_000_000, engine=engine))
+    assert len(chunks) == 1
+    pdtest.assert_frame_equal(pandas.concat(chunks), expected)
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 500])
+def test_iter_parse_small_chunks(chunksize):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    expected = asos.parse_file(datpath, engine="fast")
+    chunks = list(asos.iter_parse(datpath, chunksize=chunksize, engine="fast"))
+    result = pandas.concat(chunks)
+    assert result.index.is_unique
+    pdtest.assert_index_equal(result.index, expected.index)
+    # the reset time and the carried-over precip are the same as they are
+    # for the whole file
+    pdtest.assert_frame_equal(result, expected, check_freq=False)
+
+
+@pytest.mark.parametrize("engine", ["metar", "fast"])
+@pytest.mark.parametrize(
+    ("fields", "columns"),
+    [
+        (["precipitation"], ["raw_precipitation", "precipitation"]),
+        (
+            ["temperature", "raw_precipitation"],
+            ["raw_precipitation", "temperature", "precipitation"],
+        ),
+        ("sky_cover", ["sky_cover"]),
+        (
+            ["wind_speed", "wind_direction", "air_pressure", "dew_point"],
+            ["dew_point", "wind_speed", "wind_direction", "air_pressure"],
+        ),
+    ],
+)
+def test_parse_file_fields(engine, fields, columns):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    full = asos.parse_file(datpath, engine=engine)
+    result = asos.parse_file(datpath, engine=engine, fields=fields)
+    pdtest.assert_frame_equal(result, full[columns])
+
+
+def test_parse_file_bad_fields():
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with pytest.raises(ValueError):
+        asos.parse_file(datpath, fields=["precipitation", "junk"])
+
+
+@pytest.fixture
+def raw_lines():
+    header = "24229KPDX PDX201701080900149"
+    return [
+        f"{header}01/08/17 08:54:31  5-MIN KPDX 081654Z\n",
+        f"{header}01/08/17 09:00:31  5-MIN KPDX 081700Z\n",
+        f"{header}01/08/17 09:00:31  5-MIN KPDX 081700Z\n",
+        f"{header}01/08/17 09:03:31  5-MIN KPDX 081703Z\n",
+        f"{header}01/08/17 09:08:31  5-MIN KPDX 081708Z\n",
+        "short\n",
+        f"{header}02/30/17 09:08:31  5-MIN KPDX 301708Z",
+    ]
+
+
+@pytest.mark.parametrize("empty", [True, False])
+def test__RawFile(raw_lines, empty):
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_text("" if empty else "".join(raw_lines))
+        with asos._RawFile(raw_file) as raw:
+            if empty:
+                assert len(raw) == 0
+                assert raw.lines() == []
+                assert not raw.duplicated().any()
+            else:
+                assert raw.lines() == raw_lines
+                assert raw.lines([False, True] * 3 + [False]) == raw_lines[1:6:2]
+                nptest.assert_array_equal(
+                    raw.datetimes, asos._line_datetimes(raw_lines)
+                )
+                nptest.assert_array_equal(raw.duplicated(), [0, 0, 1, 0, 0, 0, 0])
+
+
+def test__prefilter(raw_lines):
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_text("".join(raw_lines))
+        with asos._RawFile(raw_file) as raw:
+            nptest.assert_array_equal(asos._prefilter(raw), [1, 1, 0, 1, 1, 1, 1])
+            lo, hi = asos._time_window("2017-01-08 09:00", "2017-01-08 09:05")
+            result = asos._prefilter(raw, lo, hi)
+            nptest.assert_array_equal(result, [0, 1, 0, 1, 0, 0, 0])
+
+
+@pytest.mark.parametrize(
+    ("start", "stop", "first", "last"),
+    [
+        (
+            "2017-01-08 06:00",
+            "2017-01-08 09:30",
+            "2017-01-08 06:00",
+            "2017-01-08 09:30",
+        ),
+        (None, "2017-01-08 09", "2017-01-08 03:25", "2017-01-08 09:55"),
+        ("2017-01-08 11:00", "2017-01-08", "2017-01-08 11:00", "2017-01-08 11:50"),
+    ],
+)
+def test_parse_file_window(start, stop, first, last):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    full = asos.parse_file(datpath, engine="fast")
+    with mock.patch.object(asos, "_parse_fast", wraps=asos._parse_fast) as parser:
+        result = asos.parse_file(datpath, engine="fast", start=start, stop=stop)
+        assert len(parser.call_args.args[0]) < full.shape[0]
+    pdtest.assert_frame_equal(result, full.loc[first:last])
+
+
+@pytest.mark.parametrize(("engine", "decoded"), [("metar", 5), ("fast", 3)])
+def test_parse_file_diagnostics(engine, decoded):
+    header = (
+        "24229KPDX PDX20170108090014901/08/17 09:{:02d}:31  5-MIN KPDX 0817{:02d}Z "
+    )
+    bodies = [
+        "11006KT 10SM OVC010 10/05 A2990 40 78 -1900 090/06 RMK AO2 P0005",
+        "11006KT 10SM OVC010 10/05 A2990 40 RMK AO2 PK WND 10035/2499 P0005",
+        "11006KT 10SM OVC010 10/05 A2990 40 RMK AO2 P0005",
+        "11006KT 10SM OVC010 10/05 A2990 JUNK 40 RMK AO2 P0005",
+    ]
+    lines = [header.format(5 * n, 5 * n) + body for n, body in enumerate(bodies)]
+    lines.append("garbage")
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_text("\n".join(lines) + "\n")
+        df, diag = asos.parse_file(raw_file, engine=engine, diagnostics=True)
+
+    assert df.shape[0] == 4
+    assert isinstance(diag, asos.ParseDiagnostics)
+    assert (diag.lines, diag.decoded, diag.errors) == (5, decoded, 0)
+    assert diag.warnings == {"_handlePeakWindRemark": 1, "unparsed": 2}
+    assert diag.unparsed_groups == {"JUNK": 1, "garbage": 1}
+    assert diag.samples["_handlePeakWindRemark"] == [lines[1]]
+    assert diag
+
+
+def test_parse_file_metar_warnings():
+    line = (
+        "24229KPDX PDX20170108090014901/08/17 09:05:31  5-MIN KPDX 081705Z "
+        "11006KT 10SM OVC010 10/05 A2990 JUNK 40 RMK AO2 P0005"
+    )
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_text(line + "\n")
+        with warnings.catch_warnings(record=True) as caught:
+            asos.parse_file(raw_file)
+        assert not [w for w in caught if w.category is RuntimeWarning]
+
+    # the metar library's warnings are only silenced while parsing
+    with warnings.catch_warnings(record=True) as caught:
+        Metar.Metar(
+            line[line.index("KPDX 08") :].replace("JUNK", "RUBBISH"), strict=False
+        )
+    assert any(w.category is RuntimeWarning for w in caught)
+
+
+def test_parse_file_bad_engine():
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with pytest.raises(ValueError):
+        asos.parse_file(datpath, engine="junk")
+
+
+_header = "24229KPDX PDX20170108032511501/08/17 03:25:31  5-MIN KPDX 081125Z "
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "11006KT 10SM BKN055 OVC075 M02/M05 A2990 40 78 -1900 090/06 RMK AO2 T10171050",
+        "VRB03KT 1 1/2SM -FZRA BR OVC100 M01/M04 A2981 130 78 -1700 VRB/03 RMK P0003",
+        "05007G23KT 010V090 10SM CLR 01/M04 A2978 160 66 -1400 350V070 RMK T0011",
+        "10023G35KT 7SM -FZRA 00/M01 A2968 250 96 -1400 RMK AO2 PK WND 10035/1654 P0005",
+        "00000KT 10SM FEW010 M00/ A2990 40 1234 RMK AO2 P0001 P0002 T10011",
+        "37010KT 10SM OVC010 10/05 A2990 40 RMK AO2",
+        "11006KT 10SM ///055 10/05 A2990 40 RMK AO2",
+        "11006KT 10SM OVC010 10/05 A2990 40 RMK AO2 PK WND 10035/2499 P0005",
+        "11006KT 10SM OVC010 10/05 A2990 40 RMK AO2 WSHFT 1654 P0005",
+        "11006KT 10SM OVC010 10/05 A2990 40",
+        "",
+    ],
+)
+def test__parse_fast_matches_metar(body):
+    lines = [_header + body + "\n", "garbage\n"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            expected = asos._parse_metar(lines)
+        except KeyError:
+            with pytest.raises(KeyError):
+                asos._parse_fast(lines)
+        else:
+            result = asos._parse_fast(lines)
+            pdtest.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("workers", [None, 1, 2])
+def test__parse_files(workers):
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as rawdir:
+        raw_files = []
+        for month in ["01", "02"]:
+            raw_file = pathlib.Path(rawdir).joinpath(f"64010KPDX2017{month}.dat")
+            raw_file.write_text(
+                datpath.read_text().replace("01/08/17", f"{month}/08/17")
+            )
+            raw_files.append(raw_file)
+
+        frames = asos._parse_files(raw_files, workers=workers, engine="fast")
+        assert len(frames) == 2
+        assert frames[0].index[0] == pandas.Timestamp("2017-01-08 03:25")
+        assert frames[1].index[0] == pandas.Timestamp("2017-02-08 03:25")
+        pdtest.assert_frame_equal(frames[0], asos.parse_file(raw_files[0]))
+
+
+def test_ParseCache():
+    pytest.importorskip("pyarrow")
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        # drop the sky groups from a line to get some "NA" sky cover
+        raw_file.write_text(datpath.read_text().replace("FEW055 OVC075 ", "", 1))
+        expected = asos.parse_file(raw_file)
+        assert (expected["sky_cover"] == "NA").any()
+
+        cache = asos.ParseCache(pathlib.Path(topdir).joinpath("cache"))
+        assert cache.get(raw_file) is None
+        cache.put(raw_file, expected)
+        pdtest.assert_frame_equal(cache.get(raw_file), expected)
+        assert cache.get(raw_file, new_precipcol="rain") is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        raw_file.write_text(datpath.read_text())
+        assert cache.get(raw_file) is None
+
+        # the stale entry is replaced, entries of other options are kept
+        cache.put(raw_file, expected)
+        assert len(list(cache.folder.iterdir())) == 1
+        cache.put(raw_file, expected, new_precipcol="rain")
+        assert len(list(cache.folder.iterdir())) == 2
+        pdtest.assert_frame_equal(cache.get(raw_file), expected)
+        cache.invalidate(raw_file)
+        assert len(list(cache.folder.iterdir())) == 0
+
+        cache.put(raw_file, expected)
+        cache.invalidate()
+        assert len(list(cache.folder.iterdir())) == 0
+
+
+@pytest.mark.parametrize("compact", [True, "category"])
+def test_parse_file_compact(compact):
+    pytest.importorskip("pyarrow")
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_text(datpath.read_text().replace("FEW055 OVC075 ", "", 1))
+        full = asos.parse_file(raw_file, engine="fast")
+        result = asos.parse_file(raw_file, engine="fast", compact=compact)
+
+        categorical = ["sky_cover", "wind_direction"] if compact == "category" else []
+        for col in result.columns:
+            expected = "category" if col in categorical else "float32"
+            assert result[col].dtype == expected
+
+        expected = full.assign(
+            sky_cover=full["sky_cover"].mask(full["sky_cover"].eq("NA")).astype(float)
+        )
+        pdtest.assert_frame_equal(
+            result.astype(float), expected, check_dtype=False, atol=1e-5
+        )
+        assert result.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+
+        cache = asos.ParseCache(pathlib.Path(topdir).joinpath("cache"))
+        cache.put(raw_file, result, compact=compact)
+        pdtest.assert_frame_equal(cache.get(raw_file, compact=compact), result)
+
+
+def test_parse_file_bad_compact():
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with pytest.raises(ValueError):
+        asos.parse_file(datpath, compact="small")
+
+
+def test__parse_files_cache():
+    pytest.importorskip("pyarrow")
+    datpath = pathlib.Path(get_test_file("sample_asos.dat"))
+    with tempfile.TemporaryDirectory() as topdir:
+        raw_file = pathlib.Path(topdir).joinpath("64010KPDX201701.dat")
+        raw_file.write_bytes(datpath.read_bytes())
+        cache = asos.ParseCache(pathlib.Path(topdir).joinpath("cache"))
+
+        first = asos._parse_files([raw_file], cache=cache, engine="fast")
+        with mock.patch("cloudside.asos.parse_file") as parser:
+            second = asos._parse_files([raw_file], cache=cache, engine="fast")
+            parser.assert_not_called()
+
+        assert (cache.hits, cache.misses) == (1, 1)
+        pdtest.assert_frame_equal(first[0], second[0])
+
+
+def test_RawCatalog():
+    ts = pandas.Timestamp("2017-01-01")
+    with tempfile.TemporaryDirectory() as rawdir:
+        with asos.RawCatalog(rawdir) as catalog:
+            assert catalog.get("KPDX", ts) is None
+            catalog.record_fetch("KPDX", ts, "64010KPDX201701.dat", 10, "abc", 10)
+            catalog.record_fetch("KSEA", ts, "64010KSEA201701.dat", 5, "def", 10)
+            catalog.record_parse("64010KPDX201701.dat", "ok")
+
+        with asos.RawCatalog(rawdir) as catalog:
+            entries = catalog.entries(["KPDX", "KSEA"], [ts, ts + asos.MONTHLY])
+            assert sorted(entries) == [("KPDX", "2017-01"), ("KSEA", "2017-01")]
+            pdx = entries[("KPDX", "2017-01")]
+            assert pdx.complete and pdx.parse_status == "ok"
+            assert catalog.path_of(pdx) == pathlib.Path(rawdir, "64010KPDX201701.dat")
+            assert not entries[("KSEA", "2017-01")].complete
+
+            catalog.forget("64010KSEA201701.dat")
+            assert catalog.get("KSEA", ts) is None
+
+
+def test_get_data_catalog(ftp_server):
+    email = "tester@cloudside.net"
+    opts = dict(folder=None, engine="fast", catalog=True)
+    with tempfile.TemporaryDirectory() as topdir:
+        opts["folder"] = topdir
+        first = asos.get_data("KPDX", "2016-11-01", "2016-12-31", email, **opts)
+        catalog = asos.RawCatalog(pathlib.Path(topdir, "01-raw"))
+        entries = catalog.entries(["KPDX"], first.index)
+        assert sorted(entries) == [("KPDX", "2016-11"), ("KPDX", "2016-12")]
+        assert all(e.complete and e.parse_status == "ok" for e in entries.values())
+
+        # everything is known and the sizes in the listing haven't changed,
+        # so no file is asked for
+        with mock.patch.object(asos, "_fetch_file") as fetcher:
+            second = asos.get_data("KPDX", "2016-11-01", "2016-12-31", email, **opts)
+            fetcher.assert_not_called()
+        pdtest.assert_frame_equal(first, second)
+
+        # the current month grows on the server, so it is fetched again
+        home = ftp_server.handler.authorizer.get_home_dir("anonymous")
+        dec = pathlib.Path(home, "pub/data/asos-fivemin/6401-2016/64010KPDX201612.dat")
+        content = dec.read_bytes()
+        dec.write_bytes(content + content.replace(b"12/08/16", b"12/09/16"))
+        with mock.patch.object(asos, "_fetch_file", wraps=asos._fetch_file) as fetcher:
+            grown = asos.get_data("KPDX", "2016-11-01", "2016-12-31", email, **opts)
+            fetched = [c.args[1].strftime("%Y-%m") for c in fetcher.call_args_list]
+            assert fetched == ["2016-12"]
+        assert grown.loc["2016-12-09"].shape[0] > 0
+        pdtest.assert_frame_equal(grown.loc[: first.index[-1]], first)
+        entries = catalog.entries(["KPDX"], first.index)
+        assert entries[("KPDX", "2016-12")].local_size == dec.stat().st_size
+
+        # unchanged files aren't downloaded again, even when forced...
+        with mock.patch.object(ftplib.FTP, "retrbinary") as retr:
+            asos.get_data(
+                "KPDX", "2016-11-01", "2016-12-31", email, force_download=True, **opts
+            )
+            retr.assert_not_called()
+
+        # ...but partial downloads are
+        nov = entries[("KPDX", "2016-11")]
+        ts = pandas.Timestamp(nov.month)
+        catalog.record_fetch("KPDX", ts, nov.name, 10, "", nov.remote_size)
+        retrbinary = ftplib.FTP.retrbinary
+        with mock.patch.object(ftplib.FTP, "retrbinary", autospec=True) as retr:
+            retr.side_effect = retrbinary
+            asos.get_data("KPDX", "2016-11-01", "2016-12-31", email, **opts)
+            assert retr.call_count == 1
+        assert catalog.get("KPDX", ts).complete
+
+
+def test_get_data_catalog_closed(ftp_server):
+    email = "tester@cloudside.net"
+    close = asos.RawCatalog.close
+    with tempfile.TemporaryDirectory() as topdir:
+        opts = dict(folder=topdir, engine="fast")
+        with mock.patch.object(asos.RawCatalog, "close", autospec=True) as closer:
+            closer.side_effect = close
+            asos.get_data(
+                "KPDX", "2016-11-01", "2016-11-30", email, catalog=True, **opts
+            )
+            asos.get_data_many(
+                ["KPDX"], "2016-11-01", "2016-11-30", email, catalog=True, **opts
+            )
+            assert closer.call_count == 2
+
+            # catalogs that are passed in are left open
+            with asos.RawCatalog(pathlib.Path(topdir, "01-raw")) as catalog:
+                asos.get_data(
+                    "KPDX", "2016-11-01", "2016-11-30", email, catalog=catalog, **opts
+                )
+                assert closer.call_count == 2
+            assert closer.call_count == 3
+
+
 @mock.patch("ftplib.FTP")
 @mock.patch("cloudside.validate.unique_index")
 @mock.patch("cloudside.asos._fetch_file")
@@ -241,3 +969,250 @@ def test_get_data(parser, fetcher, checker, ftp):
         )
         assert fetcher.call_count == 6
         assert parser.call_count == 6
+
+
+@pytest.mark.parametrize("connections", [1, 3])
+def test__iter_fetched_backpressure(connections):
+    started = []
+
+    def fetch(job):
+        started.append(job)
+        if job == 5:
+            raise ValueError("no such job")
+        return job * 10
+
+    fetched = asos._iter_fetched(fetch, list(range(20)), connections, maxsize=2)
+    first = next(fetched)
+    time.sleep(0.1)
+    # the threads wait for room in the queue
+    assert len(started) <= 2 + 1 + connections
+    results = dict([first, *fetched])
+    assert sorted(results) == list(range(20))
+    assert isinstance(results.pop(5), ValueError)
+    assert all(result == job * 10 for job, result in results.items())
+
+
+def test_get_data_pipelined(ftp_server):
+    fetched = []
+    parsed_after = []
+    with tempfile.TemporaryDirectory() as topdir:
+        fetch_file = asos._fetch_file
+
+        def fetch(*args, **kwargs):
+            fetched.append(args[1])
+            return fetch_file(*args, **kwargs)
+
+        def parse(raw_file, **opts):
+            parsed_after.append(len(fetched))
+            return asos.parse_file(raw_file, **opts)
+
+        with mock.patch.object(asos, "_fetch_file", side_effect=fetch):
+            with mock.patch.object(asos, "_parse_file_or_error", side_effect=parse):
+                result = asos.get_data_many(
+                    ["KPDX"],
+                    "2016-11-01",
+                    "2017-03-31",
+                    "tester@cloudside.net",
+                    folder=topdir,
+                    engine="fast",
+                )[0]
+
+        expected = asos.get_data(
+            "KPDX",
+            "2016-11-01",
+            "2017-03-31",
+            "tester@cloudside.net",
+            folder=topdir,
+            engine="fast",
+        )
+        pdtest.assert_frame_equal(result.loc["KPDX"], expected)
+        # the first file was parsed before the last one was fetched, since the
+        # fetcher can only get so far ahead
+        assert len(fetched) == 5
+        assert parsed_after[0] < len(fetched)
+
+
+def test_get_data_workers(ftp_server):
+    opts = dict(email="tester@cloudside.net", engine="fast")
+    with tempfile.TemporaryDirectory() as topdir:
+        expected = asos.get_data(
+            "KPDX", "2016-11-01", "2017-01-31", folder=topdir, **opts
+        )
+        pool = mock.patch.object(
+            asos, "ProcessPoolExecutor", wraps=asos.ProcessPoolExecutor
+        )
+        with tempfile.TemporaryDirectory() as otherdir, pool as executor:
+            result = asos.get_data(
+                "KPDX", "2016-11-01", "2017-01-31", folder=otherdir, workers=2, **opts
+            )
+        # the workers aren't forked from a process with fetching threads
+        assert executor.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+    pdtest.assert_frame_equal(result, expected)
+
+
+def test_get_data_window(ftp_server):
+    with tempfile.TemporaryDirectory() as topdir:
+        fetching = mock.patch.object(asos, "_fetch_file", wraps=asos._fetch_file)
+        parsing = mock.patch.object(asos, "_parse_fast", wraps=asos._parse_fast)
+        with fetching as fetcher, parsing as parser:
+            result = asos.get_data(
+                "KPDX",
+                "2016-12-08 06:00",
+                "2016-12-08 09:30",
+                "tester@cloudside.net",
+                folder=topdir,
+                engine="fast",
+            )
+            assert fetcher.call_count == 1
+        assert result.index[0] == pandas.Timestamp("2016-12-08 06:00")
+        assert result.index[-1] == pandas.Timestamp("2016-12-08 09:30")
+
+        # only the lines in the window are decoded
+        raw_file = pathlib.Path(topdir, "01-raw", "64010KPDX201612.dat")
+        assert len(parser.call_args.args[0]) < len(raw_file.read_text().splitlines())
+
+
+def test_get_data_window_cache(ftp_server):
+    pytest.importorskip("pyarrow")
+    with tempfile.TemporaryDirectory() as topdir:
+        cache = asos.ParseCache(pathlib.Path(topdir).joinpath("cache"))
+        email = "tester@cloudside.net"
+        # the sample files only have data on the 8th of every month
+        for start in ["2016-11-08 06:00", "2016-11-08 07:00", "2016-11-08 06:00"]:
+            result = asos.get_data(
+                "KPDX",
+                start,
+                "2016-12-20",
+                email,
+                folder=topdir,
+                engine="fast",
+                cache=cache,
+            )
+            assert result.index[0] == pandas.Timestamp(start)
+
+        # the months are cached whole, so moving the window doesn't matter
+        assert (cache.hits, cache.misses) == (4, 2)
+
+
+def test_update(ftp_server):
+    pytest.importorskip("pyarrow")
+    email = "tester@cloudside.net"
+    with tempfile.TemporaryDirectory() as topdir:
+        with pytest.raises(ValueError):
+            asos.update("KPDX", email, folder=topdir)
+
+        first = asos.update(
+            "KPDX", email, "2016-11-15", "2017-01-31", folder=topdir, engine="fast"
+        )
+        store = pathlib.Path(topdir).joinpath("03-store", "KPDX")
+        assert sorted(p.name for p in store.iterdir()) == [
+            "2016-11.parquet",
+            "2016-12.parquet",
+            "2017-01.parquet",
+        ]
+        mtimes = {p.name: p.stat().st_mtime_ns for p in store.iterdir()}
+
+        with mock.patch.object(asos, "_fetch_file", wraps=asos._fetch_file) as fetcher:
+            second = asos.update("KPDX", email, stopdate="2017-03-31", folder=topdir)
+            fetched = [c.args[1].strftime("%Y-%m") for c in fetcher.call_args_list]
+            assert fetched == ["2017-01", "2017-02", "2017-03"]
+            assert all(c.kwargs["force_download"] for c in fetcher.call_args_list)
+
+        assert (
+            mtimes["2016-11.parquet"]
+            == store.joinpath("2016-11.parquet").stat().st_mtime_ns
+        )
+        assert store.joinpath("2017-03.parquet").exists()
+        pdtest.assert_frame_equal(second.loc[: first.index[-1]], first)
+        assert second.index[-1] == pandas.Timestamp("2017-03-08 11:50")
+        pdtest.assert_frame_equal(second, asos.read_store("KPDX", folder=topdir))
+
+
+def test_get_data_many(ftp_server):
+    home = pathlib.Path(ftp_server.handler.authorizer.get_home_dir("anonymous"))
+    for src in home.glob("pub/data/asos-fivemin/*/64010KPDX*.dat"):
+        src.with_name(src.name.replace("KPDX", "KSEA")).write_bytes(src.read_bytes())
+
+    email = "tester@cloudside.net"
+    stations = ["KPDX", "KSEA", "KXXX"]
+    with tempfile.TemporaryDirectory() as topdir:
+        with mock.patch.object(asos, "_FTPPool", wraps=asos._FTPPool) as pool:
+            weather, errors = asos.get_data_many(
+                stations,
+                "2016-11-01",
+                "2017-01-31",
+                email,
+                folder=topdir,
+                connections=2,
+            )
+            pool.assert_called_once()
+        expected = asos.get_data(
+            "KPDX", "2016-11-01", "2017-01-31", email, folder=topdir
+        )
+
+        assert list(errors) == ["KXXX"]
+        assert isinstance(errors["KXXX"], ValueError)
+        assert weather.index.names == ["station", "datetime"]
+        assert weather.index.get_level_values("station").unique().tolist() == [
+            "KPDX",
+            "KSEA",
+        ]
+        pdtest.assert_frame_equal(weather.loc["KPDX"], expected, check_freq=False)
+        pdtest.assert_frame_equal(weather.loc["KSEA"], expected, check_freq=False)
+
+        frames, errors = asos.get_data_many(
+            stations, "2016-11-01", "2017-01-31", email, folder=topdir, as_dict=True
+        )
+        assert sorted(frames) == ["KPDX", "KSEA"]
+        pdtest.assert_frame_equal(frames["KSEA"], expected)
+
+
+def test_get_data_many_parse_error(ftp_server):
+    email = "tester@cloudside.net"
+    with tempfile.TemporaryDirectory() as topdir:
+        with mock.patch.object(asos, "parse_file", side_effect=RuntimeError("bad")):
+            weather, errors = asos.get_data_many(
+                ["KPDX"], "2016-11-01", "2016-12-31", email, folder=topdir
+            )
+        assert weather.empty
+        assert isinstance(errors["KPDX"], RuntimeError)
+
+
+def test_tail(ftp_server):
+    pytest.importorskip("pyarrow")
+    home = pathlib.Path(ftp_server.handler.authorizer.get_home_dir("anonymous"))
+    remote = home.joinpath("pub/data/asos-fivemin/6401-2017/64010KPDX201701.dat")
+    full = remote.read_bytes()
+    email = "tester@cloudside.net"
+    retrbinary = ftplib.FTP.retrbinary
+    with tempfile.TemporaryDirectory() as topdir:
+        # the cuts fall in the middle of lines and hours
+        for cut in [3000, 3100, 9000, 12345, len(full), len(full)]:
+            remote.write_bytes(full[:cut])
+            with mock.patch.object(ftplib.FTP, "retrbinary", autospec=True) as retr:
+                retr.side_effect = retrbinary
+                recent = asos.tail(
+                    "KPDX", email, month="2017-01", folder=topdir, engine="fast"
+                )
+
+            raw_file = pathlib.Path(topdir, "01-raw", remote.name)
+            assert raw_file.read_bytes() == full[:cut]
+            if cut == 3000:
+                assert retr.call_args.kwargs["rest"] is None
+            elif retr.called:
+                # only the new bytes are downloaded
+                assert 0 < retr.call_args.kwargs["rest"] < cut
+            else:
+                assert recent is None
+
+        expected = asos.parse_file(raw_file, engine="fast")
+        result = asos.read_store("KPDX", folder=topdir)
+        pdtest.assert_frame_equal(result, expected, check_freq=False)
+
+        # the remote file was replaced by a shorter one, so it starts over
+        remote.write_bytes(full[:5000])
+        recent = asos.tail("KPDX", email, month="2017-01", folder=topdir, engine="fast")
+        assert raw_file.read_bytes() == full[:5000]
+        pdtest.assert_frame_equal(
+            asos.read_store("KPDX", folder=topdir), recent, check_freq=False
+        )
@@ -9,7 +9,16 @@ def test_get_asos(get_data):
     args = ["KPDX", "2018-01-01", "2018-05-01", "test@devnull.net"]
     CliRunner().invoke(cli.get_asos, args)
     get_data.assert_called_with(
-        *args, folder=".", force_download=False, pbar_fxn=cli.tqdm
+        *args, folder=".", force_download=False, pbar_fxn=cli.tqdm, workers=None
+    )
+
+
+@mock.patch("cloudside.asos.get_data")
+def test_get_asos_jobs(get_data):
+    args = ["KPDX", "2018-01-01", "2018-05-01", "test@devnull.net"]
+    CliRunner().invoke(cli.get_asos, args + ["--jobs", "4"])
+    get_data.assert_called_with(
+        *args, folder=".", force_download=False, pbar_fxn=cli.tqdm, workers=4
     )
 
 
@@ -1,16 +1,21 @@
 from pathlib import Path
 from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from textwrap import dedent
+import gzip
+import json
 import tempfile
+import threading
 import warnings
 
 import pandas
+import requests
 
 from unittest import mock
 import pytest
 import pandas.testing as pdtest
 
-from cloudside import hydra
+from cloudside import hydra, validate
 from cloudside.tests import get_test_file  # noqa
 
 
@@ -106,6 +111,23 @@ def test_parse_file(expected_hydra):
         pdtest.assert_frame_equal(expected_hydra, result)
 
 
+def test_parse_file_gzip(expected_hydra):
+    with tempfile.TemporaryDirectory() as rawdir:
+        filepath = Path(rawdir).joinpath("sample_hydra.txt.gz")
+        with validate.open_raw(filepath, "wb") as dst:
+            dst.write(Path(get_test_file("sample_hydra.txt")).read_bytes())
+        result = hydra.parse_file(filepath)
+        pdtest.assert_frame_equal(expected_hydra, result)
+
+
+def test_parse_file_tips(expected_hydra):
+    filepath = Path(get_test_file("sample_hydra.txt"))
+    result = hydra.parse_file(filepath, tips=True)
+    assert result["sample_hydra"].dtype == "Int16"
+    assert result["sample_hydra"].sum() == 39
+    pdtest.assert_frame_equal(hydra.tips_to_depth(result), expected_hydra)
+
+
 @mock.patch("requests.get")
 @mock.patch("cloudside.validate.unique_index")
 @mock.patch("cloudside.hydra._fetch_file", return_value="this/kpdx.txt")
@@ -113,7 +135,195 @@ def test_parse_file(expected_hydra):
 def test_get_data(parser, fetcher, checker, getter):
     with tempfile.TemporaryDirectory() as topdir:
         hydra.get_data("KPDX", folder=topdir)
-        parser.assert_called_once_with("this/kpdx.txt")
+        parser.assert_called_once_with("this/kpdx.txt", tips=False)
         fetcher.assert_called_once_with(
-            "KPDX", Path(topdir) / "01-raw", force_download=False
+            "KPDX", Path(topdir) / "01-raw", force_download=False, compression=None
+        )
+
+
+@pytest.fixture
+def hydra_server():
+    """Local stand-in for the Hydra Network's web server. It supports
+    conditional requests and gzip content-encoding and logs the status of
+    every response (before sending it) and the client port of every request.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            server.ports.append(self.client_address[1])
+            station = self.path.strip("/").split(".")[0]
+            if station not in server.bodies:
+                server.statuses.append(404)
+                self.send_error(404)
+                return
+
+            etag = '"{}"'.format(hash(server.bodies[station]))
+            if self.headers.get("If-None-Match") == etag:
+                server.statuses.append(304)
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            body = server.bodies[station]
+            server.statuses.append(200)
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", "Sat, 06 Oct 2018 00:00:00 GMT")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.body = Path(get_test_file("sample_hydra.txt")).read_bytes()
+    server.bodies = {"kpdx": server.body}
+    server.statuses = []
+    server.ports = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    with mock.patch.object(hydra, "HYDRA_URL", f"http://{host}:{port}/{{}}.rain"):
+        yield server
+    server.shutdown()
+    thread.join()
+
+
+def test__fetch_file_conditional(hydra_server):
+    with tempfile.TemporaryDirectory() as rawdir:
+        result = hydra._fetch_file("KPDX", rawdir)
+        assert result == Path(rawdir) / "kpdx.txt"
+        assert result.read_bytes() == hydra_server.body
+        mtime = result.stat().st_mtime_ns
+
+        # nothing changed, so only a 304
+        assert hydra._fetch_file("KPDX", rawdir) == result
+        assert result.stat().st_mtime_ns == mtime
+        assert hydra_server.statuses == [200, 304]
+
+        assert hydra._fetch_file("KPDX", rawdir, force_download=True) == result
+        hydra_server.body = hydra_server.body.replace(b"Daily", b"Daily ")
+        hydra_server.bodies["kpdx"] = hydra_server.body
+        assert hydra._fetch_file("KPDX", rawdir) == result
+        assert result.read_bytes() == hydra_server.body
+        assert hydra_server.statuses == [200, 304, 200, 200]
+
+        with pytest.raises(requests.HTTPError):
+            hydra._fetch_file("junk", rawdir)
+
+
+def test__fetch_file_compression(hydra_server):
+    with tempfile.TemporaryDirectory() as rawdir:
+        Path(rawdir).joinpath("kpdx.txt").write_text("old")
+        result = hydra._fetch_file("KPDX", rawdir, compression="gzip")
+        assert result == Path(rawdir) / "kpdx.txt.gz"
+        assert sorted(p.name for p in Path(rawdir).iterdir()) == [
+            "kpdx.http.json",
+            "kpdx.txt.gz",
+        ]
+        with validate.open_raw(result) as stored:
+            assert stored.read() == hydra_server.body
+
+        # stored copies are used whether they're compressed or not
+        assert hydra._fetch_file("KPDX", rawdir) == result
+        assert hydra_server.statuses == [200, 304]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_get_data_many(hydra_server, workers):
+    # the second gauge only has the last few days
+    hydra_server.bodies["ksea"] = b"\n".join(hydra_server.body.splitlines()[:13])
+    hydra_server.bodies["bad"] = b"this is not a rain file"
+    stations = ["KPDX", "ksea", "bad", "missing"]
+    with tempfile.TemporaryDirectory() as topdir:
+        rain, errors = hydra.get_data_many(
+            stations, folder=topdir, connections=2, workers=workers
+        )
+        kpdx = hydra.get_data("KPDX", folder=topdir)
+
+    assert rain.columns.tolist() == ["KPDX", "ksea"]
+    assert rain.index.freq == "h"
+    assert rain.index.name == "datetime"
+    pdtest.assert_series_equal(
+        rain["KPDX"].loc[kpdx.index],
+        kpdx["kpdx"],
+        check_names=False,
+        check_freq=False,
+    )
+    assert rain["ksea"].first_valid_index() > rain["KPDX"].first_valid_index()
+
+    assert sorted(errors) == ["bad", "missing"]
+    assert isinstance(errors["missing"], requests.HTTPError)
+
+    # the four files share kept-alive connections
+    assert len(set(hydra_server.ports[:4])) < 4
+
+
+def test_update(hydra_server):
+    full = hydra_server.body
+    lines = full.splitlines(keepends=True)
+    # the day before the newest wasn't over, and the newest day was missing
+    older = lines[:11] + [lines[12].replace(b"   0   0", b"   -   -")] + lines[13:]
+    hydra_server.bodies["kpdx"] = b"".join(older)
+
+    with tempfile.TemporaryDirectory() as topdir, mock.patch.object(
+        hydra, "_rain_frame", wraps=hydra._rain_frame
+    ) as rain_frame:
+
+        def expected():
+            raw_path = Path(topdir, "01-raw", "kpdx.txt")
+            return hydra.parse_file(raw_path)
+
+        rain = hydra.update("KPDX", folder=topdir)
+        assert rain_frame.call_args.args[0].shape[0] == 2
+        pdtest.assert_frame_equal(rain, expected())
+
+        # only the previously newest day and the new day are parsed
+        hydra_server.bodies["kpdx"] = full
+        rain = hydra.update("KPDX", folder=topdir)
+        assert rain_frame.call_args.args[0]["Date"].dt.day.tolist() == [8, 7]
+        pdtest.assert_frame_equal(rain, expected())
+
+        # a revision of older data is noticed and everything is parsed again
+        hydra_server.bodies["kpdx"] = full.replace(
+            b"06-OCT-2018     4", b"06-OCT-2018     5"
         )
+        rain = hydra.update("KPDX", folder=topdir)
+        assert rain_frame.call_args.args[0].shape[0] == 3
+        pdtest.assert_frame_equal(rain, expected())
+
+        state = json.loads(Path(topdir, "03-store", "kpdx.state.json").read_text())
+        assert state["last_date"] == "2018-10-08 23:00:00"
+
+        # switching to tip counts parses everything again...
+        rain = hydra.update("KPDX", folder=topdir, tips=True)
+        assert rain_frame.call_args.args[0].shape[0] == 3
+        assert rain["kpdx"].dtype == "Int16"
+        pdtest.assert_frame_equal(hydra.tips_to_depth(rain), expected())
+
+        # ...and so does a store that no longer ends on the last parsed date
+        rain.iloc[:-24].to_parquet(Path(topdir, "03-store", "kpdx.parquet"))
+        rain = hydra.update("KPDX", folder=topdir, tips=True)
+        assert rain_frame.call_args.args[0].shape[0] == 3
+
+        rain = hydra.update("KPDX", folder=topdir, tips=True)
+        assert rain_frame.call_args.args[0].shape[0] == 1
+        raw_path = Path(topdir, "01-raw", "kpdx.txt")
+        pdtest.assert_frame_equal(rain, hydra.parse_file(raw_path, tips=True))
+
+
+def test_get_data_many_tips(hydra_server):
+    hydra_server.bodies["ksea"] = b"\n".join(hydra_server.body.splitlines()[:13])
+    with tempfile.TemporaryDirectory() as topdir:
+        tips, errors = hydra.get_data_many(["KPDX", "ksea"], folder=topdir, tips=True)
+        depths, _ = hydra.get_data_many(["KPDX", "ksea"], folder=topdir)
+
+    assert not errors
+    assert tips.dtypes.tolist() == ["Int16", "Int16"]
+    pdtest.assert_frame_equal(hydra.tips_to_depth(tips), depths)
@@ -1,5 +1,8 @@
 from matplotlib import figure
 from matplotlib import axes
+from pathlib import Path
+import tempfile
+
 import pandas
 
 import pytest
@@ -66,3 +69,30 @@ def unique_index(index, error):
     x = pandas.Series(range(4), index=index)
     with raises(error):
         pdtest.assert_series_equal(x, validate.unique_index(x))
+
+
+@pytest.mark.parametrize(
+    ("compression", "suffix"), [(None, ""), ("gzip", ".gz"), ("zstd", ".zst")]
+)
+def test_compression(compression, suffix):
+    assert validate.compression(compression) == suffix
+    assert validate.compression_of(f"file.dat{suffix}") == compression
+
+
+def test_compression_invalid():
+    with raises(ValueError):
+        validate.compression("bz2")
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz", ".zst"])
+def test_open_raw(suffix):
+    if suffix == ".zst":
+        pytest.importorskip("zstandard")
+    with tempfile.TemporaryDirectory() as rawdir:
+        filepath = Path(rawdir).joinpath(f"file.dat{suffix}")
+        with validate.open_raw(filepath, "w") as dst:
+            dst.write("line 1\nline 2\n")
+        with validate.open_raw(filepath, "r") as src:
+            assert list(src) == ["line 1\n", "line 2\n"]
+        assert validate.stored_file(Path(rawdir, "file.dat")) == filepath
+        assert validate.stored_file(Path(rawdir).joinpath("other.dat")) is None
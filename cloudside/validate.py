@@ -2,6 +2,11 @@ from matplotlib import figure
 from matplotlib import axes
 
 import os
+import gzip
+from pathlib import Path
+
+# file name suffix of each way that raw files can be stored
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
 
 
 def axes_object(ax, polar=None):
@@ -46,10 +51,80 @@ def step(step):
     return step.lower()
 
 
+def compression(compression):
+    """checks that a *compression* value is valid and returns the suffix of
+    the files stored with it"""
+    if compression not in COMPRESSION_SUFFIXES:
+        options = ", ".join(map(repr, COMPRESSION_SUFFIXES))
+        raise ValueError(f"compression must be one of {options}, not {compression!r}")
+    return COMPRESSION_SUFFIXES[compression]
+
+
+def compression_of(filename):
+    """returns how a raw file is compressed, judging by its name"""
+    suffix = Path(filename).suffix
+    for compression, known in COMPRESSION_SUFFIXES.items():
+        if compression is not None and suffix == known:
+            return compression
+    return None
+
+
+def stored_file(filepath):
+    """finds the copy of a raw file that exists on disk, uncompressed or
+    compressed. Returns None if there isn't one."""
+    filepath = Path(filepath)
+    for suffix in COMPRESSION_SUFFIXES.values():
+        stored = filepath.with_name(filepath.name + suffix)
+        if stored.exists():
+            return stored
+    return None
+
+
+def _open_zstd(filename, mode, **text_opts):
+    try:  # python 3.14 and later
+        from compression import zstd
+    except ImportError:
+        try:
+            import zstandard as zstd
+        except ImportError:
+            raise ImportError("zstd compression requires `zstandard`") from None
+    return zstd.open(filename, mode, **text_opts)
+
+
+def open_raw(filename, mode="rb"):
+    """opens a raw file, (de)compressing it on the fly if its name ends in
+    ".gz" or ".zst"
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+    mode : str (default is "rb")
+        Any mode accepted by `open`. Text is read and written as ASCII and
+        any other bytes are replaced.
+
+    Returns
+    -------
+    file object
+
+    """
+
+    text_opts = {}
+    if "b" not in mode:
+        mode = mode.replace("t", "") + "t"
+        text_opts = {"encoding": "ascii", "errors": "replace"}
+
+    compression = compression_of(filename)
+    if compression == "gzip":
+        return gzip.open(filename, mode, **text_opts)
+    elif compression == "zstd":
+        return _open_zstd(filename, mode, **text_opts)
+    return open(filename, mode, **text_opts)
+
+
 def file_status(filename):
     """confirms that a raw file isn't empty"""
     if os.path.exists(filename):
-        with open(filename, "r") as testfile:
+        with open_raw(filename, "r") as testfile:
             line = testfile.readline()
 
         if line: